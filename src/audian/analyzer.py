@@ -38,6 +38,14 @@ class Analyzer(object):
     Or you open a new window using, for example, a QDialog with
     self.browser as parent.
 
+    Analyzers also run without display on whole files via the
+    `audian-analyze` script (see `batchanalyzer.py`). Then the
+    browser has no `panels` and event markers are not plotted.
+
+    Set `trace_names` in the constructor to the names of the traces
+    your `analyze()` function needs. Only these traces are then
+    prepared for a selected region.
+
     Parameters
     ----------
     browser: DataBrowser
@@ -59,6 +67,9 @@ class Analyzer(object):
         Trace on which the analyzer will work on.
         You rarely need to access the full source trace, since
         `analyze()` provides all the traces of the selected region.
+    trace_names: None or list of str
+        Names of the traces needed by `analyze()`.
+        If None, all traces are provided.
     data: thunderlab.TableData
         The table storing the analysis results.
     events: dict of list of pyqtgraph.ScatterPlotItem
@@ -83,6 +94,7 @@ class Analyzer(object):
         self.name = name
         self.source_name = source_name
         self.source = self.trace(self.source_name)
+        self.trace_names = None
         self.data = TableData()
         self.events = {}
         self.browser.add_analyzer(self)
@@ -111,10 +123,14 @@ class Analyzer(object):
             End time of the selected region.
         channel: int
             Channel of the selected region.
-        traces: dict of arrays
-            Dictionary with all data traces from `channel`
-            cut out between `t0` and `t1`.
-            Keys are the names of the data traces.
+        traces: Region
+            Dictionary with the data traces from `channel` cut out
+            between `t0` and `t1`, all of them or the ones listed in
+            `trace_names`. Keys are the names of the data traces.
+            Values unpack into `(time, data)`, or `(time, freqs, data)`
+            for spectrograms. Data and times are only computed when
+            accessed. The data are views into the buffers of the
+            traces, copy them if you want to keep them.
         """
         pass
 
@@ -208,6 +224,9 @@ class Analyzer(object):
 
         """
         self.events[name] = []
+        if self.browser.panels is None:
+            # no display:
+            return
         for c in range(self.browser.data.data.channels):
             spi = pg.ScatterPlotItem()
             spi.setSymbol(symbol)
@@ -242,6 +261,9 @@ class Analyzer(object):
 
         """
         self.events[name] = []
+        if self.browser.panels is None:
+            # no display:
+            return
         panel = self.browser.panels[panel_name]
         for ax in panel.axs:
             spi = pg.ScatterPlotItem()
@@ -274,7 +296,7 @@ class Analyzer(object):
             y-coordinates of the event marker.
 
         """
-        for c in range(self.browser.data.data.channels):
+        for c in range(len(self.events[name])):
             if c == channel or channel < 0:
                 self.events[name][c].setData(x, y)
             else:
@@ -303,7 +325,7 @@ class Analyzer(object):
             y-coordinates of the event marker.
 
         """
-        for c in range(self.browser.data.data.channels):
+        for c in range(len(self.events[name])):
             if c == channel or channel < 0:
                 self.events[name][c].addPoints(x, y)
         
@@ -328,6 +350,7 @@ class PlainAnalyzer(Analyzer):
 
     def __init__(self, browser):
         super().__init__(browser, 'plain', 'data')
+        self.trace_names = []
         nd = int(floor(-log10(1/self.source.rate)))
         if nd < 0:
             nd = 0
@@ -23,6 +23,11 @@ from audioio import available_formats, PlayAudio, AudioLoader
 
 from .version import __version__, __year__
 from .databrowser import DataBrowser
+from .compresseddata import CompressedData
+from .buffereddata import BufferedData
+from .bufferedenvelope import BufferedEnvelope
+from .channelloader import ChannelLoader
+from .memorybudget import MemoryBudget, memory_budget
 from .fulltraceplot import secs_to_str
 from .plugins import Plugins
 from .panels import Panel
@@ -1160,6 +1165,15 @@ class Audian(QMainWindow):
                                  self.browser().show_cbars,
                                  self.browser().show_fulldata)
 
+
+    def toggle_fullspec(self):
+        self.browser().toggle_fullspec()
+        if self.link_panels:
+            for b in self.browsers:
+                if not b is self.browser() and \
+                   b.show_fullspec != self.browser().show_fullspec:
+                    b.toggle_fullspec()
+
                     
     def setup_panel_actions(self, menu):
         self.acts.link_panels = QAction('Link &panels', self)
@@ -1187,6 +1201,10 @@ class Audian(QMainWindow):
         self.acts.toggle_fulldata = QAction('Toggle full data', self)
         self.acts.toggle_fulldata.setShortcut('Ctrl+F')
         self.acts.toggle_fulldata.triggered.connect(self.toggle_fulldata)
+
+        self.acts.toggle_fullspec = QAction('Toggle full spectrogram', self)
+        self.acts.toggle_fullspec.setShortcut('Ctrl+Shift+F')
+        self.acts.toggle_fullspec.triggered.connect(self.toggle_fullspec)
             
         panel_menu = menu.addMenu('&Panels')
         panel_menu.addAction(self.acts.link_panels)
@@ -1195,6 +1213,7 @@ class Audian(QMainWindow):
         panel_menu.addAction(self.acts.toggle_power)
         panel_menu.addAction(self.acts.toggle_cbars)
         panel_menu.addAction(self.acts.toggle_fulldata)
+        panel_menu.addAction(self.acts.toggle_fullspec)
 
         self.data_menus.append(panel_menu)
         
@@ -1262,11 +1281,15 @@ class Audian(QMainWindow):
         self.acts.key_shortcuts.setShortcut('Ctrl+K')
         self.acts.key_shortcuts.triggered.connect(self.shortcuts)
         
+        self.acts.memory = QAction('&Memory usage', self)
+        self.acts.memory.triggered.connect(self.memory_usage)
+        
         self.acts.about = QAction('&About Audian', self)
         self.acts.about.triggered.connect(self.about)
         
         help_menu = menu.addMenu('&Help')
         help_menu.addAction(self.acts.key_shortcuts)
+        help_menu.addAction(self.acts.memory)
         help_menu.addAction(self.acts.about)
         return help_menu
         
@@ -1325,7 +1348,7 @@ class Audian(QMainWindow):
     def load_files(self, file_paths):
         self.file_paths = [Path(fp) for fp in file_paths]
         self.file_paths = [fp for fp in self.file_paths
-                           if not fp.name.endswith('-fulltrace.wav')]
+                           if not fp.stem.endswith('-fulltrace')]
         if len(self.file_paths) == 0:
             return
         if len(self.browsers) > 0:
@@ -1436,6 +1459,11 @@ class Audian(QMainWindow):
         dialog.show()
 
 
+    def memory_usage(self):
+        QMessageBox.information(self, 'Memory usage',
+                                f'<pre>{memory_budget.report()}</pre>')
+
+
     def about(self):
         QMessageBox.about(self, 'About Audian', f'''
 <b>Audian</b>, version {__version__}<br>(c) {__year__}''')
@@ -1488,6 +1516,20 @@ def audian_cli(cargs=[], plugins=None):
     parser.add_argument('-U', dest='unwrap_clip', default=0, type=float,
                         metavar='UNWRAP', const=1.5, nargs='?',
                         help='unwrap clipped data with threshold relative to maximum input range and clip using unwrap() from audioio package')
+    parser.add_argument('-j', dest='workers', default=0, type=int,
+                        metavar='WORKERS',
+                        help='number of worker processes for computing the full traces (default: number of CPUs minus one)')
+    parser.add_argument('-d', dest='dtype', default='float32',
+                        choices=['float32', 'float64'],
+                        help='floating point type of the data buffers (default: float32)')
+    parser.add_argument('-m', dest='memory', default=4, type=float,
+                        metavar='MEMORY',
+                        help='maximum memory in GB used by the buffers of all opened data, 0 for no limit (default: 4)')
+    parser.add_argument('-e', dest='causal_envelope', action='store_true',
+                        help='compute envelopes causally in a single pass that continues while scrolling forward (default: forward and backward filtering)')
+    parser.add_argument('-E', dest='decimate_envelope', default=0, type=float,
+                        metavar='DECIMATE',
+                        help='sample envelopes at DECIMATE times their cutoff frequency, 0 for no decimation (default: 0)')
     parser.add_argument('files', nargs='*', default=[], type=str,
                         help='name of files with the time series data')
     args, qt_args = parser.parse_known_args(cargs)
@@ -1514,6 +1556,20 @@ def audian_cli(cargs=[], plugins=None):
     # kwargs for data loader:
     load_kwargs = parse_load_kwargs(args.load_kwargs)
 
+    # worker processes:
+    CompressedData.workers = args.workers
+
+    # precision of data buffers:
+    BufferedData.dtype = np.dtype(args.dtype)
+    ChannelLoader.dtype = np.dtype(args.dtype)
+
+    # memory budget of all data buffers:
+    MemoryBudget.max_bytes = args.memory*1e9
+
+    # envelopes of plugins:
+    BufferedEnvelope.causal = args.causal_envelope
+    BufferedEnvelope.decimate = args.decimate_envelope
+
     # expand wildcard patterns:
     files = []
     if os.name == 'nt':
@@ -0,0 +1,375 @@
+"""BatchAnalyzer
+
+Run analyzers on whole files without display.
+
+The analyzers are applied to all marker regions of the files, or to
+successive windows of fixed length. The files are analyzed in
+parallel by a pool of worker processes. The results of all files are
+merged into a single table with the name of the file in the first
+column.
+
+Analyzers and traces are set up like in the data browser, including
+the plugins found in the current working directory. Each analyzer
+gets a `BatchBrowser` instead of a `DataBrowser`.
+"""
+
+import os
+import sys
+import glob
+import argparse
+import numpy as np
+
+from pathlib import Path
+from multiprocessing import Pool, set_start_method
+from audioio.audioconverter import parse_load_kwargs
+from thunderlab.tabledata import TableData
+
+from .version import __version__, __year__
+from .data import Data
+from .plugins import Plugins
+from .analyzer import PlainAnalyzer
+from .statisticsanalyzer import StatisticsAnalyzer
+
+
+class BatchBrowser(object):
+    """Stand-in for the DataBrowser without display.
+
+    Provides the data, traces, and analyzers to plugins and
+    analyzers. It has no `panels`, analyzers do not plot event
+    markers.
+
+    Parameters
+    ----------
+    file_path: str or Path
+        Path of the data file.
+    load_kwargs: dict
+        Key-word arguments for the data loader.
+    plugins: Plugins
+        Plugins setting up traces and analyzers.
+    """
+
+    def __init__(self, file_path, load_kwargs, plugins):
+        self.data = Data(file_path, **load_kwargs)
+        self.panels = None
+        self.plugins = plugins
+        self.analyzers = []
+        self.plugins.setup_traces(self)
+        self.data.setup_traces()
+
+
+    def get_trace(self, name):
+        return self.data[name]
+
+
+    def add_trace(self, trace):
+        self.data.add_trace(trace)
+
+
+    def remove_trace(self, name):
+        self.data.remove_trace(name)
+
+
+    def clear_traces(self):
+        self.data.clear_traces()
+
+
+    def get_analyzer(self, name):
+        for a in self.analyzers:
+            if name.lower() == a.name.lower():
+                return a
+        return None
+
+
+    def add_analyzer(self, analyzer):
+        self.analyzers.append(analyzer)
+
+
+    def remove_analyzer(self, name):
+        for k, a in enumerate(self.analyzers):
+            if name.lower() == a.name.lower():
+                del self.analyzers[k]
+
+
+    def clear_analyzer(self):
+        self.analyzers = []
+
+
+    def add_to_panel_trace(self, trace_name, channel, plot_item):
+        pass
+
+
+    def open(self, unwrap, unwrap_clip, highpass_cutoff, lowpass_cutoff,
+             channels, analyzers):
+        """Open the data and set up the analyzers.
+
+        Parameters
+        ----------
+        unwrap: float
+            Threshold for unwrapping clipped data.
+        unwrap_clip: bool
+            Whether unwrapped data are clipped.
+        highpass_cutoff: float or None
+            Cutoff frequency of the highpass filter in Hz.
+        lowpass_cutoff: float or None
+            Cutoff frequency of the lowpass filter in Hz.
+        channels: list of int
+            Channels to be analyzed. All if empty.
+        analyzers: list of str
+            Names of the analyzers to be run. All if empty.
+        """
+        self.data.open(unwrap, unwrap_clip)
+        if 'filtered' in self.data:
+            filtered = self.data['filtered']
+            filter_changed = False
+            if highpass_cutoff is not None:
+                filtered.highpass_cutoff = highpass_cutoff
+                filter_changed = True
+            if lowpass_cutoff is not None:
+                filtered.lowpass_cutoff = lowpass_cutoff
+                filter_changed = True
+            if filter_changed:
+                filtered.update()
+        self.channels = [c for c in channels if c < self.data.channels]
+        if len(self.channels) == 0:
+            self.channels = list(range(self.data.channels))
+        self.data.set_channels(self.channels)
+        # raw data buffer follows the analyzed regions:
+        self.data.data.need_update = True
+        PlainAnalyzer(self)
+        StatisticsAnalyzer(self)
+        self.plugins.setup_analyzer(self)
+        if len(analyzers) > 0:
+            names = [name.lower() for name in analyzers]
+            self.analyzers = [a for a in self.analyzers
+                              if a.name.lower() in names]
+
+
+    def regions(self, window=0, step=0):
+        """Regions to be analyzed.
+
+        Parameters
+        ----------
+        window: float
+            Duration of successive windows in seconds.
+            If zero, use the regions of the markers of the data
+            with non-zero span.
+        step: float
+            Step between successive windows in seconds.
+            If zero, use `window`.
+
+        Returns
+        -------
+        regions: list of tuple of float
+            Start and end time of each region.
+        """
+        duration = self.data.frames/self.data.rate
+        if window <= 0:
+            locs, labels = self.data.data.markers()
+            regions = []
+            for pos, span in locs:
+                if span > 0:
+                    t0 = max(0, pos/self.data.rate)
+                    t1 = min(duration, (pos + span)/self.data.rate)
+                    regions.append((t0, t1))
+            return regions
+        if step <= 0:
+            step = window
+        starts = np.arange(0, duration - window + 1e-8, step)
+        return [(t0, t0 + window) for t0 in starts]
+
+
+    def analyze(self, regions):
+        """Run the analyzers on regions of all channels.
+
+        Parameters
+        ----------
+        regions: list of tuple of float
+            Start and end time of each region.
+        """
+        names = set()
+        for a in self.analyzers:
+            if a.trace_names is None:
+                names = None
+                break
+            names.update(a.trace_names)
+        for t0, t1 in regions:
+            self.data.update_times(t0, t1)
+            # traces are computed once for all channels:
+            region = self.data.get_region(t0, t1, self.channels[0], names,
+                                          self.channels)
+            for channel in self.channels:
+                traces = region.select(channel)
+                for a in self.analyzers:
+                    a.analyze(t0, t1, channel, traces)
+
+
+    def table(self):
+        """Results of all analyzers.
+
+        Returns
+        -------
+        table: TableData
+            The columns of all analyzers, preceded by the path of
+            the data file.
+        """
+        table = TableData()
+        table.append('file', '', '%s')
+        for a in self.analyzers:
+            for c in range(a.data.columns()):
+                table.append(a.data.label(c), a.data.unit(c),
+                             a.data.format(c), value=a.data.data[c])
+        nrows = max([len(table.data[c]) for c in range(1, table.columns())],
+                    default=0)
+        table.data[0] = [os.fspath(self.data.file_path)]*nrows
+        return table
+
+
+    def close(self):
+        self.data.close()
+
+
+def analyze_file(file_path, settings):
+    """Run analyzers on a single file.
+
+    Worker function of the process pool.
+
+    Parameters
+    ----------
+    file_path: str
+        Path of the data file.
+    settings: dict
+        Settings from the command line.
+
+    Returns
+    -------
+    table: TableData or None
+        The analysis results, None on failure.
+    """
+    plugins = Plugins()
+    plugins.load_plugins()
+    browser = None
+    try:
+        browser = BatchBrowser(file_path, settings['load_kwargs'], plugins)
+        browser.open(settings['unwrap'], settings['unwrap_clip'],
+                     settings['highpass_cutoff'],
+                     settings['lowpass_cutoff'],
+                     settings['channels'], settings['analyzers'])
+        regions = browser.regions(settings['window'], settings['step'])
+        browser.analyze(regions)
+        table = browser.table()
+        print(f'analyzed {len(regions)} regions of {file_path}')
+        return table
+    except Exception as e:
+        print(f'! ERROR: failed to analyze {file_path}: {e}')
+        return None
+    finally:
+        if browser is not None:
+            browser.close()
+
+
+def main(cargs):
+    set_start_method('forkserver' if os.name == 'posix' else 'spawn')
+    # command line arguments:
+    parser = argparse.ArgumentParser(description='Run audian analyzers on marker regions or windows of many files.', epilog=f'version {__version__} by Jan Benda (2026-{__year__})')
+    parser.add_argument('--version', action='version', version=__version__)
+    parser.add_argument('-c', dest='channels', default='',
+                        type=str, metavar='CHANNELS',
+                        help='comma separated list of channels to be analyzed (first channel is 0, default: all)')
+    parser.add_argument('-f', dest='highpass_cutoff', type=float,
+                        metavar='FREQ', default=None,
+                        help='cutoff frequency of highpass filter in Hz')
+    parser.add_argument('-l', dest='lowpass_cutoff', type=float,
+                        metavar='FREQ', default=None,
+                        help='cutoff frequency of lowpass filter in Hz')
+    parser.add_argument('-w', dest='window', default=0, type=float,
+                        metavar='WINDOW',
+                        help='analyze successive windows of WINDOW seconds (default: analyze marker regions)')
+    parser.add_argument('-s', dest='step', default=0, type=float,
+                        metavar='STEP',
+                        help='step between successive windows in seconds (default: WINDOW)')
+    parser.add_argument('-a', dest='analyzers', default='',
+                        type=str, metavar='ANALYZERS',
+                        help='comma separated list of names of the analyzers to be run (default: all)')
+    parser.add_argument('-i', dest='load_kwargs', default=[],
+                        action='append', metavar='KWARGS',
+                        help='key-word arguments for the data loader function')
+    parser.add_argument('-u', dest='unwrap', default=0, type=float,
+                        metavar='UNWRAP', const=1.5, nargs='?',
+                        help='unwrap clipped data with threshold relative to maximum input range and divide by two using unwrap() from audioio package')
+    parser.add_argument('-U', dest='unwrap_clip', default=0, type=float,
+                        metavar='UNWRAP', const=1.5, nargs='?',
+                        help='unwrap clipped data with threshold relative to maximum input range and clip using unwrap() from audioio package')
+    parser.add_argument('-j', dest='workers', default=0, type=int,
+                        metavar='WORKERS',
+                        help='number of worker processes (default: number of CPUs minus one)')
+    parser.add_argument('-o', dest='output', default='audian-analysis.csv',
+                        type=str, metavar='OUTPUT',
+                        help='file for the merged analysis results, format from extension (default: audian-analysis.csv)')
+    parser.add_argument('files', nargs='+', default=[], type=str,
+                        help='name of files with the time series data')
+    args = parser.parse_args(cargs)
+
+    # selected channels:
+    cs = [s.strip() for s in args.channels.split(',')]
+    channels = []
+    for c in cs:
+        if len(c) == 0:
+            continue
+        css = [s.strip() for s in c.split('-')]
+        if len(css) == 2:
+            channels.extend(list(range(int(css[0]), int(css[1])+1)))
+        else:
+            channels.append(int(c))
+
+    # unwrap:
+    if args.unwrap_clip > 1e-3:
+        args.unwrap = args.unwrap_clip
+        args.unwrap_clip = True
+    else:
+        args.unwrap_clip = False
+
+    # expand wildcard patterns:
+    files = []
+    if os.name == 'nt':
+        for fn in args.files:
+            files.extend(sorted(glob.glob(fn)))
+    else:
+        files = args.files
+
+    settings = dict(load_kwargs=parse_load_kwargs(args.load_kwargs),
+                    unwrap=args.unwrap, unwrap_clip=args.unwrap_clip,
+                    highpass_cutoff=args.highpass_cutoff,
+                    lowpass_cutoff=args.lowpass_cutoff,
+                    channels=channels,
+                    analyzers=[s.strip() for s in args.analyzers.split(',')
+                               if len(s.strip()) > 0],
+                    window=args.window, step=args.step)
+
+    # analyze files in worker processes:
+    nprocs = args.workers
+    if nprocs <= 0:
+        nprocs = max(1, os.cpu_count() - 1)
+    nprocs = min(nprocs, len(files))
+    table = TableData()
+    failed = 0
+    with Pool(nprocs) as pool:
+        jobs = [(fp, settings) for fp in files]
+        for ftable in pool.starmap(analyze_file, jobs, chunksize=1):
+            if ftable is None:
+                failed += 1
+            else:
+                table.add(ftable, add_all=True)
+    table.write(args.output, unit_style='header', column_numbers=None,
+                sections=0)
+    print(f'wrote {table.rows()} rows of {len(files) - failed} files to {args.output}')
+    if failed > 0:
+        print(f'! failed to analyze {failed} files')
+
+
+def run():
+    main(sys.argv[1:])
+    return 0
+
+
+if __name__ == '__main__':
+    run()
@@ -1,14 +1,61 @@
 """Base class for computed data.
+
+For each channel the range of frames in the buffer that hold valid
+data is tracked. Changing parameters invalidates the buffers, moving
+buffers keeps the valid frames and leaves the new frames invalid, and
+recomputing only processes the invalid frames. The `generation` is
+incremented whenever valid frames are invalidated, e.g. by changed
+parameters. Plots keep what they derived from frames that stayed
+valid within the same generation.
+
+Only the active channels, usually the displayed ones, are computed.
+The other channels are filled in as soon as they are activated or
+requested via `recompute_channels()`.
+
+Ranges of single channels are processed independently of the buffer
+by detached copies of the traces (`detach()`), e.g. for analyzing
+selected regions without moving the displayed buffers.
+
+Buffers are allocated with the floating point type `dtype`, single
+precision by default.
+
+Traces of different tabs on the same data with the same class, name,
+`settings`, and source share their buffer (`share()`). The buffer is
+computed by one of them, the `owner`, the other ones forward the
+`shared_attributes` to it. A trace stops sharing its buffer as soon
+as its settings are changed (`fork()`). Traces that do not list their
+`settings` are never shared.
 """
 
+import threading
 import numpy as np
 
+from copy import copy
 from math import floor, ceil
 from audioio import BufferedArray
 
 
+def is_valid(data):
+    """Whether all frames in the buffer of some data are valid.
+
+    Data without tracking of valid frames, like the raw data, are
+    always valid.
+    """
+    if isinstance(data, BufferedData):
+        return data.is_valid()
+    return True
+
+
 class BufferedData(BufferedArray):
 
+    chunk_time = 5.0
+    dtype = np.dtype(np.float32)
+    causal = True
+    settings = None
+    shared_attributes = ('buffer', 'offset', 'bufferframes', 'backframes',
+                         'valid', 'active', 'compute_channels',
+                         'generation', 'lock')
+
     def __init__(self, name, source_name, tbefore=0, tafter=0,
                  panel='none', panel_type='trace',
                  color='#00ee00', lw_thin=1.1, lw_thick=2):
@@ -28,6 +75,30 @@ class BufferedData(BufferedArray):
         self.source_tafter = tafter
         self.dests = []
         self.need_update = False
+        self.compressed = None
+        self.recomputer = None
+        self.generation = 0
+        self.valid = np.zeros((0, 2), dtype=int)
+        self.active = np.zeros(0, dtype=bool)
+        self.compute_channels = np.zeros(0, dtype=bool)
+        self.show_channels = None
+        self.lock = threading.Lock()
+        self.owner = None
+        self.sharers = []
+
+
+    def __getattr__(self, name):
+        # shared attributes are taken from the trace computing the buffer:
+        owner = self.__dict__.get('owner')
+        if owner is None or name not in self.shared_attributes:
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+        return getattr(owner, name)
+
+
+    def __getitem__(self, key):
+        if self.owner is not None:
+            return self.owner[key]
+        return super().__getitem__(key)
 
 
     def expand_times(self, tbefore, tafter):
@@ -37,6 +108,7 @@ class BufferedData(BufferedArray):
 
 
     def update_step(self, step=1, more_shape=None):
+        self.fork()
         tbuffer = self.bufferframes/self.rate
         if step < 1:
             step = 1
@@ -54,6 +126,7 @@ class BufferedData(BufferedArray):
             self.bufferframes = int(tbuffer*self.rate)
         self.offset = (self.source.offset + step - 1)//step
         self.follow = 0
+        self.generation += 1
 
         
     def open(self, source, step=1, more_shape=None):
@@ -67,12 +140,47 @@ class BufferedData(BufferedArray):
         self.channels = self.source.channels
         self.rate = self.source.rate
         self.buffer_changed = np.zeros(self.channels, dtype=bool)
-        self.buffer = np.zeros((0, self.channels))
+        self.buffer = np.zeros((0, self.channels), self.dtype)
+        self.valid = np.zeros((self.channels, 2), dtype=int)
+        self.active = np.ones(self.channels, dtype=bool)
+        self.compute_channels = np.array(self.active)
+        self.show_channels = None
         self.plot_items = [None]*self.channels
         self.update_step(step, more_shape)
 
         
-    def align_buffer(self):
+    def align_buffer(self, fill=True):
+        """Move the buffer to the buffer of the source.
+
+        Recycled frames keep their valid range. New frames are not
+        computed by moving the buffer, they are invalid.
+
+        Parameters
+        ----------
+        fill: bool
+            If True, process all invalid frames right away. Otherwise
+            leave them to `recompute()`, usually in the background.
+        """
+        if self.owner is not None:
+            self.owner.align_buffer(fill)
+            return
+        offset, nframes = self.aligned_position()
+        self.shift_buffer(offset, nframes)
+        self.bufferframes = len(self.buffer)
+        if fill and is_valid(self.source):
+            self.recompute()
+
+
+    def aligned_position(self):
+        """Position of the buffer aligned to the buffer of the source.
+
+        Returns
+        -------
+        offset: int
+           Frame index of the first frame of the aligned buffer.
+        nframes: int
+           Number of frames of the aligned buffer.
+        """
         soffset = self.source.offset
         snframes = len(self.source.buffer)
         if soffset > 0:
@@ -84,19 +192,299 @@ class BufferedData(BufferedArray):
             snframes -= n
         offset = ceil(soffset*self.rate/self.source.rate)
         nframes = floor((soffset + snframes)*self.rate/self.source.rate) - offset
-        self.move_buffer(offset, nframes)
-        self.bufferframes = len(self.buffer)
+        if offset < 0:
+            offset = 0
+        if offset + nframes > self.frames:
+            nframes = self.frames - offset
+        return offset, nframes
+
+
+    def shift_buffer(self, offset, nframes):
+        """Move and resize the buffer without computing new frames.
+
+        Like `BufferedArray.move_buffer()`, but frames that are not
+        recycled from the previous buffer are set to zero instead of
+        being loaded. They stay invalid until they are computed by
+        `recompute()`.
+
+        Parameters
+        ----------
+        offset: int
+           Frame index of the first frame in the new buffer.
+        nframes: int
+           Number of frames the new buffer should hold.
+        """
+        if offset < 0:
+            offset = 0
+        if offset + nframes > self.frames:
+            nframes = self.frames - offset
+        if offset != self.offset or nframes != len(self.buffer):
+            r_offset, r_nframes = self._recycle_buffer(offset, nframes)
+            self.offset = offset
+            i = r_offset - offset
+            self.buffer[i:i + r_nframes] = 0
+            self.set_changed()
+
+
+    def allocate_buffer(self, nframes=None, force=False):
+        """Reallocate the buffer with `dtype`.
+
+        Replaces `BufferedArray.allocate_buffer()` that always
+        allocates double precision.
+        """
+        if self.bufferframes > self.frames:
+            self.bufferframes = self.frames
+            self.backframes = 0
+        if nframes is None:
+            nframes = self.bufferframes
+        if nframes == 0:
+            return
+        if force or nframes != len(self.buffer) or \
+           self.shape[1:] != self.buffer.shape[1:] or \
+           self.buffer.dtype != self.dtype:
+            shape = list(self.shape)
+            shape[0] = nframes
+            self.buffer = np.empty(shape, self.dtype)
+
+
+    def _recycle_buffer(self, offset, nframes):
+        end = self.offset + len(self.buffer)
+        if not self.causal and offset + nframes > end:
+            # the last frames carry the edge transient of the
+            # backward pass and are recomputed with the new frames:
+            edge = end - ceil(self.source_tbefore*self.rate)
+            edge_valid = self.valid[:, 1] > edge
+            if np.any(edge_valid & (self.valid[:, 1] > self.valid[:, 0])):
+                self.generation += 1
+            self.valid[edge_valid, 1] = np.maximum(self.valid[edge_valid, 0],
+                                                   edge)
+        r_offset, r_nframes = super()._recycle_buffer(offset, nframes)
+        # only recycled frames stay valid:
+        if r_nframes == 0:
+            r0, r1 = offset, offset + nframes
+        elif r_offset > offset:
+            r0, r1 = offset, r_offset
+        else:
+            r0, r1 = r_offset + r_nframes, offset + nframes
+        self.valid[:, 0] = np.maximum(self.valid[:, 0], r0)
+        self.valid[:, 1] = np.minimum(self.valid[:, 1], r1)
+        self.valid[self.valid[:, 1] <= self.valid[:, 0]] = r0
+        return r_offset, r_nframes
+
+
+    def set_active(self, channels=None):
+        """Set the channels that are computed.
+
+        A shared buffer is computed for the channels of all tabs
+        sharing it.
+
+        Parameters
+        ----------
+        channels: None or list of int
+            Indices of the channels to be computed. All if None.
+        """
+        self.show_channels = channels
+        owner = self if self.owner is None else self.owner
+        owner.active[:] = False
+        for trace in [owner] + owner.sharers:
+            if trace.show_channels is None:
+                owner.active[:] = True
+                break
+            owner.active[trace.show_channels] = True
+        owner.compute_channels = np.array(owner.active)
+
+
+    def share(self, owner):
+        """Share the buffer of a trace of another tab.
+
+        The own buffer is dropped. The shared buffer is computed by
+        `owner` for the active channels of all tabs.
+
+        Parameters
+        ----------
+        owner: BufferedData
+            Trace of another tab with the same class, name, settings,
+            and source that computes the buffer.
+        """
+        self.cancel_recompute()
+        for name in self.shared_attributes:
+            self.__dict__.pop(name, None)
+        self.owner = owner
+        owner.sharers.append(self)
+        owner.set_active(owner.show_channels)
+        self.buffer_changed[:] = True
+
+
+    def fork(self):
+        """Stop sharing the buffer with traces of other tabs.
+
+        Called before the settings of the trace are changed. If this
+        trace computes the shared buffer, the buffer is handed over
+        to one of the other traces. This trace and all traces derived
+        from it get their own buffers, that are invalid.
+        """
+        if self.owner is not None:
+            owner = self.owner
+            owner.sharers.remove(self)
+            self.owner = None
+        elif len(self.sharers) > 0:
+            # hand the buffer over to another tab:
+            owner = self.sharers[0]
+            owner.owner = None
+            owner.sharers = self.sharers[1:]
+            for trace in owner.sharers:
+                trace.owner = owner
+            for name in self.shared_attributes:
+                setattr(owner, name, getattr(self, name))
+            owner.reset_state()
+            self.sharers = []
+        else:
+            return
+        for name in self.shared_attributes:
+            value = getattr(owner, name)
+            if isinstance(value, np.ndarray):
+                value = np.array(value)
+            setattr(self, name, value)
+        self.lock = threading.Lock()
+        self.buffer = np.zeros_like(self.buffer)
+        self.set_valid(self.offset, self.offset)
+        self.generation += 1
+        self.reset_state()
+        self.set_changed()
+        owner.set_active(owner.show_channels)
+        self.set_active(self.show_channels)
+        for d in self.dests:
+            d.fork()
+
+
+    def set_changed(self, channels=None):
+        """Mark channels of the buffer as changed in all sharing tabs.
+
+        Parameters
+        ----------
+        channels: None, or list or mask of channels
+            The changed channels. All if None.
+        """
+        if channels is None:
+            channels = slice(None)
+        owner = self if self.owner is None else self.owner
+        for trace in [owner] + owner.sharers:
+            trace.buffer_changed[channels] = True
+
+
+    def channel_index(self):
+        """Index into the channels that are currently computed.
+
+        Returns
+        -------
+        index: slice or ndarray of int
+            A slice over all channels if all channels are computed,
+            such that buffers are processed without copies.
+        """
+        if np.all(self.compute_channels):
+            return slice(None)
+        return np.nonzero(self.compute_channels)[0]
+
+
+    def channel_groups(self):
+        """Active channels grouped by their valid frames in the buffer.
+
+        Returns
+        -------
+        groups: list of tuple
+            For each group the first and the last valid frame clipped
+            to the buffer and a boolean mask of its channels.
+        """
+        n0 = self.offset
+        n1 = self.offset + len(self.buffer)
+        groups = {}
+        for c in np.nonzero(self.active)[0]:
+            v0 = max(self.valid[c, 0], n0)
+            v1 = min(self.valid[c, 1], n1)
+            if v1 <= v0:
+                v0 = v1 = n0
+            if not (v0, v1) in groups:
+                groups[(v0, v1)] = np.zeros(self.channels, dtype=bool)
+            groups[(v0, v1)][c] = True
+        return [(v0, v1, mask) for (v0, v1), mask in groups.items()]
+
+
+    def release(self):
+        """Free the buffer.
+
+        It is recomputed by the next `align_buffer()`.
+        """
+        if self.owner is not None:
+            self.owner.release()
+            return
+        self.buffer = np.zeros((0,) + tuple(self.shape[1:]), self.dtype)
+        self.offset = 0
+        self.set_valid(0, 0)
+        self.generation += 1
+
+
+    def valid_range(self, channels=None):
+        """Range of frames that are valid in all of some channels.
+
+        Parameters
+        ----------
+        channels: None, or list or mask of channels
+            The channels to be considered. The active ones if None.
+
+        Returns
+        -------
+        start: int
+            Index of the first valid frame.
+        stop: int
+            Index after the last valid frame. Not larger than `start`
+            if there are no valid frames.
+        """
+        if channels is None:
+            channels = self.active
+        valid = self.valid[channels]
+        if len(valid) == 0:
+            return 0, self.frames
+        return np.max(valid[:, 0]), np.min(valid[:, 1])
+
+
+    def set_valid(self, start, stop, channels=None):
+        """Set the range of valid frames.
+
+        Parameters
+        ----------
+        start: int
+            Index of the first valid frame.
+        stop: int
+            Index after the last valid frame.
+        channels: None, int, or list or mask of channels
+            Channels to which the range applies. All if None.
+        """
+        if channels is None:
+            channels = slice(None)
+        self.valid[channels, 0] = start
+        self.valid[channels, 1] = max(start, stop)
+
+
+    def is_valid(self):
+        """Whether all frames of the buffer are valid in active channels.
+        """
+        v0, v1 = self.valid_range()
+        return v0 <= self.offset and v1 >= self.offset + len(self.buffer)
 
 
     def load_buffer(self, offset, nframes, buffer):
-        print(f'load {self.name} {offset/self.rate:.3f} - {(offset + nframes)/self.rate:.3f}')
+        if self.verbose > 1:
+            print(f'load {self.name} {offset/self.rate:.3f} - {(offset + nframes)/self.rate:.3f}')
         # transform to rate of source buffer:
         soffset = floor(offset*self.source.rate/self.rate)
         snframes = ceil((offset + nframes)*self.source.rate/self.rate) - soffset
-        nbefore = floor(self.source_tbefore/self.source.rate)
+        nbefore = floor(self.source_tbefore*self.source.rate)
         soffset -= nbefore
         snframes += nbefore
-        nafter = ceil(self.source_tafter/self.source.rate)
+        nafter = ceil(self.source_tafter*self.source.rate)
+        if not self.causal:
+            # frames before valid frames need post-roll, too:
+            nafter = max(nafter, nbefore)
         snframes += nafter
         soffset -= self.source.offset
         if soffset < 0:
@@ -106,13 +494,148 @@ class BufferedData(BufferedArray):
         if soffset + snframes > len(self.source.buffer):
             snframes = len(self.source.buffer) - soffset
         source = self.source.buffer[soffset:soffset + snframes]
-        self.process(source, buffer, nbefore)
+        self.process_channels(source, buffer, nbefore)
 
 
-    def recompute(self):
-        if len(self.source.buffer) > 0:
-            self.allocate_buffer()
-        self.reload_buffer()
+    def process_channels(self, source, dest, nbefore):
+        """Process the channels in `compute_channels` only.
+
+        The other channels of `dest` are left untouched.
+        """
+        channels = self.channel_index()
+        if isinstance(channels, slice):
+            self.process(source, dest, nbefore)
+            return
+        sdest = np.empty((len(dest), len(channels)) + dest.shape[2:],
+                         dtype=dest.dtype)
+        self.process(source[:, channels], sdest, nbefore)
+        dest[:, channels] = sdest
+
+
+    def recompute(self, recomputer=None):
+        """Process the invalid frames of the buffer.
+
+        Parameters
+        ----------
+        recomputer: Recomputer or None
+            If given, the buffer is computed in chunks of `chunk_time`
+            seconds, and computation stops as soon as the
+            recomputer is cancelled. A `chunk_time` of zero
+            computes the buffer in a single chunk. A buffer shared
+            between tabs is computed by only one of them at a time.
+        """
+        if self.owner is not None:
+            self.owner.recompute(recomputer)
+            return
+        with self.lock:
+            n0 = self.offset
+            n1 = self.offset + len(self.buffer)
+            nchunk = max(1, len(self.buffer))
+            if recomputer is not None and self.chunk_time > 0:
+                nchunk = max(1, int(self.chunk_time*self.rate))
+            try:
+                for v0, v1, channels in self.channel_groups():
+                    self.compute_channels = channels
+                    # extend valid frames to the end, then fill frames before:
+                    for s0, s1 in [(v1, n1), (n0, v0)]:
+                        for i in range(s0, s1, nchunk):
+                            if recomputer is not None and recomputer.cancelled:
+                                return
+                            n = min(nchunk, s1 - i)
+                            self.load_buffer(i, n, self.buffer[i - n0:i - n0 + n])
+                            if s0 == v1:
+                                self.set_valid(v0, i + n, channels)
+                            elif i + n == s1:
+                                self.set_valid(n0, self.valid_range(channels)[1],
+                                               channels)
+                            # partial results are shown right away:
+                            self.set_changed(channels)
+            finally:
+                self.compute_channels = np.array(self.active)
+
+
+    def detach(self, source, offset, nframes):
+        """Compute a range of frames independently of the buffer.
+
+        Parameters
+        ----------
+        source: BufferedData or object
+            Detached source holding some channels in its `buffer`
+            starting at `offset`, with `rate` and `frames` of the
+            source of this trace and the number of its `channels`.
+        offset: int
+            Index of the first frame to be computed.
+        nframes: int
+            Number of frames to be computed.
+
+        Returns
+        -------
+        trace: BufferedData
+            Copy of this trace that is not connected to any other
+            trace. Its buffer holds the computed frames of the
+            channels of the source. Computed in chunks of `chunk_time`
+            seconds.
+        """
+        if self.owner is not None:
+            return self.owner.detach(source, offset, nframes)
+        trace = copy(self)
+        trace.source = source
+        trace.dests = []
+        trace.sharers = []
+        trace.recomputer = None
+        trace.channels = source.channels
+        trace.shape = (self.frames, trace.channels) + tuple(self.shape[2:])
+        trace.plot_items = [None]*trace.channels
+        trace.buffer_changed = np.zeros(trace.channels, dtype=bool)
+        trace.valid = np.zeros((trace.channels, 2), dtype=int)
+        trace.active = np.ones(trace.channels, dtype=bool)
+        trace.compute_channels = np.ones(trace.channels, dtype=bool)
+        trace.offset = offset
+        trace.bufferframes = nframes
+        trace.backframes = 0
+        trace.buffer = np.empty((nframes,) + tuple(trace.shape[1:]),
+                                self.dtype)
+        trace.reset_state()
+        nchunk = max(1, nframes)
+        if self.chunk_time > 0:
+            nchunk = max(1, int(self.chunk_time*self.rate))
+        for i in range(0, nframes, nchunk):
+            n = min(nchunk, nframes - i)
+            trace.load_buffer(offset + i, n, trace.buffer[i:i + n])
+        trace.set_valid(offset, offset + nframes)
+        return trace
+
+
+    def reset_state(self):
+        """Forget any state carried over from previously processed frames.
+
+        Reimplement for traces that continue processing from their
+        previous state.
+        """
+        pass
+
+
+    def recompute_channels(self, channels):
+        """Process invalid frames of some channels right away.
+
+        For example, for analyzing channels that are not active.
+
+        Parameters
+        ----------
+        channels: list of int
+            Indices of the channels to be computed.
+        """
+        if self.owner is not None:
+            self.owner.recompute_channels(channels)
+            return
+        active = self.active
+        self.active = np.zeros(self.channels, dtype=bool)
+        self.active[channels] = True
+        try:
+            self.recompute()
+        finally:
+            self.active = active
+            self.compute_channels = np.array(self.active)
 
 
     def is_visible(self):
@@ -147,7 +670,48 @@ class BufferedData(BufferedArray):
             
 
     def recompute_all(self):
+        """Recompute this and all derived traces.
+
+        In the background, if a `recomputer` is set. The settings
+        have been changed, so the buffers are not shared with other
+        tabs anymore.
+        """
+        self.fork()
+        if self.recomputer is not None and self.recomputer.enabled:
+            self.invalidate_tree()
+            self.recomputer.submit(self)
+        else:
+            self.invalidate_tree()
+            self.recompute_tree()
+
+
+    def invalidate_tree(self):
+        """Mark buffers of this and all derived traces as invalid.
+
+        Buffers with a new shape are allocated right away.
+        """
+        self.set_valid(self.offset, self.offset)
+        self.generation += 1
+        if len(self.source.buffer) > 0 and \
+           (self.need_update or self.shape[1:] != self.buffer.shape[1:]):
+            self.allocate_buffer()
+        for d in self.dests:
+            d.invalidate_tree()
+
+
+    def recompute_tree(self):
         if self.need_update:
             self.recompute()
             for d in self.dests:
-                d.recompute_all()
+                d.recompute_tree()
+
+
+    def cancel_recompute(self):
+        """Stop recomputing in the background before changing parameters.
+
+        Also in all tabs sharing the buffer.
+        """
+        owner = self if self.owner is None else self.owner
+        for trace in [owner] + owner.sharers:
+            if trace.recomputer is not None:
+                trace.recomputer.cancel()
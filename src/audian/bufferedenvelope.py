@@ -1,26 +1,60 @@
 """Compute envelope on the fly.
+
+By default, the envelope is filtered forward and backward
+(`sosfiltfilt()`) over the whole buffer. A causal envelope is filtered
+in a single pass (`sosfilt()`) that continues from its previous state
+when scrolling forward. It is delayed by the filter, but is computed
+in chunks and much faster. Plugins create a causal envelope with
+`BufferedEnvelope(causal=True)`. The -e command line option makes
+causal envelopes the default for all envelopes that do not specify
+`causal`.
+
+The envelope is smooth and can be sampled at a lower rate than its
+source. With `BufferedEnvelope(decimate=10)` it is sampled at least at
+ten times its cutoff frequency. This reduces the memory and the time
+needed for plotting. The -E command line option sets the decimation
+of all envelopes that do not specify `decimate`.
 """
 
 import numpy as np
 
-from scipy.signal import butter, sosfiltfilt
+from scipy.signal import butter, sosfilt, sosfiltfilt
 
 from .buffereddata import BufferedData
 
 
 class BufferedEnvelope(BufferedData):
 
+    # defaults for envelopes that do not specify `causal` or
+    # `decimate`, set by the -e and -E command line options:
+    causal = False
+    decimate = 0
+    settings = ('envelope_cutoff', 'highpass_cutoff', 'filter_order',
+                'causal', 'decimate')
+
     def __init__(self, name='envelope', source='filtered',
                  panel='trace', color='#ff8800',
                  lw_thin=2.5, lw_thick=4, envelope_cutoff=500,
-                 filter_order=2, highpass_cutoff=0):
+                 filter_order=2, highpass_cutoff=0, causal=None,
+                 decimate=None):
         super().__init__(name, source, tbefore=1, panel=panel,
                          panel_type='trace', color=color,
                          lw_thin=lw_thin, lw_thick=lw_thick)
         self.envelope_cutoff = envelope_cutoff
         self.highpass_cutoff = highpass_cutoff
         self.filter_order = filter_order
+        if causal is not None:
+            self.causal = causal
+        if decimate is not None:
+            self.decimate = decimate
+        self.step = 1
         self.sos = None
+        self.zi = None
+        self.zi_offset = -1
+        self.zi_channels = None
+        if not self.causal:
+            # filtfilt needs the whole buffer:
+            self.chunk_time = 0
 
         
     def open(self, source):
@@ -28,29 +62,91 @@ class BufferedEnvelope(BufferedData):
         #self.ampl_min = 0
         #self.ampl_max = source.ampl_max
         self.sos = None
+        self.step = 1
+        self.zi_offset = -1
         self.update()
 
+
+    def reset_state(self):
+        self.zi = None
+        self.zi_offset = -1
+        self.zi_channels = None
+
+
+    def load_buffer(self, offset, nframes, buffer):
+        if not self.causal:
+            super().load_buffer(offset, nframes, buffer)
+            return
+        soffset = offset*self.step - self.source.offset
+        snframes = nframes*self.step
+        if self.sos is not None and offset == self.zi_offset and \
+           np.array_equal(self.compute_channels, self.zi_channels) and \
+           soffset >= 0 and soffset + snframes <= len(self.source.buffer):
+            # continue filtering where the previous segment ended:
+            self.process_channels(self.source.buffer[soffset:soffset + snframes],
+                                  buffer, 0)
+        else:
+            # filter with pre-roll from zero state:
+            if self.sos is not None:
+                self.zi = np.zeros((len(self.sos), 2, self.channels))
+            super().load_buffer(offset, nframes, buffer)
+        self.zi_offset = offset + nframes
+        self.zi_channels = np.array(self.compute_channels)
+
         
     def process(self, source, dest, nbefore):
         if self.sos is None:
             dest[:] = np.zeros_like(dest)
+        elif self.causal:
+            # single pass, the filter state is kept for the next segment:
+            channels = self.channel_index()
+            zi = self.zi[:, :, channels]
+            if nbefore > 0:
+                _, zi = sosfilt(self.sos,
+                                (np.pi/2)*np.abs(source[:nbefore]),
+                                axis=0, zi=zi)
+            env, zi = sosfilt(self.sos, (np.pi/2)*np.abs(source[nbefore:]),
+                              axis=0, zi=zi)
+            self.zi[:, :, channels] = zi
+            dest[:] = env[::self.step][:len(dest)]
+            if self.highpass_cutoff == 0:
+                dest[dest < 0] = 0
         else:
             # the integral over one hump of the sine wave is 2, the mean is 2/pi:
-            dest[:] = sosfiltfilt(self.sos, (np.pi/2)*np.abs(source), axis=0)[nbefore:]
+            env = sosfiltfilt(self.sos, (np.pi/2)*np.abs(source), axis=0)
+            dest[:] = env[nbefore::self.step][:len(dest)]
             if self.highpass_cutoff == 0:
                 dest[dest < 0] = 0
 
             
+    def envelope_step(self):
+        """Decimation of the envelope relative to its source.
+
+        With `decimate` larger than zero, the envelope is sampled at
+        a rate of at least `decimate` times `envelope_cutoff`.
+        """
+        if self.decimate <= 0 or self.envelope_cutoff <= 0:
+            return 1
+        return max(1, int(self.source.rate/(self.decimate*self.envelope_cutoff)))
+
+            
     def update(self):
+        self.cancel_recompute()
         try:
             if self.highpass_cutoff > 0:
                 self.sos = butter(self.filter_order,
                                   (self.highpass_cutoff, self.envelope_cutoff),
-                                  'bandpass', fs=self.rate, output='sos')
+                                  'bandpass', fs=self.source.rate,
+                                  output='sos')
             else:
                 self.sos = butter(self.filter_order, self.envelope_cutoff,
-                                  'lowpass', fs=self.rate, output='sos')
+                                  'lowpass', fs=self.source.rate,
+                                  output='sos')
         except ValueError:
             self.sos = None
+        step = self.envelope_step()
+        if step != self.step:
+            self.step = step
+            self.update_step(step)
+        self.zi_offset = -1
         self.recompute_all()
-
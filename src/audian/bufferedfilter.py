@@ -1,6 +1,8 @@
 """Filter data on the fly.
 """
 
+import numpy as np
+
 from scipy.signal import butter, sosfilt
 
 from .buffereddata import BufferedData
@@ -8,6 +10,8 @@ from .buffereddata import BufferedData
 
 class BufferedFilter(BufferedData):
 
+    settings = ('highpass_cutoff', 'lowpass_cutoff', 'filter_order')
+
     def __init__(self, name='filtered', source='data', panel='trace',
                  color='#00ee00', lw_thin=1.1, lw_thick=2):
         super().__init__(name, source, tbefore=10, panel=panel,
@@ -17,6 +21,9 @@ class BufferedFilter(BufferedData):
         self.lowpass_cutoff = 1
         self.filter_order = 2
         self.sos = None
+        self.zi = None
+        self.zi_offset = -1
+        self.zi_channels = None
 
         
     def open(self, source):
@@ -25,18 +32,49 @@ class BufferedFilter(BufferedData):
         self.lowpass_cutoff = self.rate/2
         self.filter_order = 2
         self.sos = None
+        self.zi_offset = -1
         self.update()
 
 
+    def reset_state(self):
+        self.zi = None
+        self.zi_offset = -1
+        self.zi_channels = None
+
+
+    def load_buffer(self, offset, nframes, buffer):
+        soffset = offset - self.source.offset
+        if self.sos is not None and offset == self.zi_offset and \
+           np.array_equal(self.compute_channels, self.zi_channels) and \
+           soffset >= 0 and soffset + nframes <= len(self.source.buffer):
+            # continue filtering where the previous segment ended:
+            self.process_channels(self.source.buffer[soffset:soffset + nframes],
+                                  buffer, 0)
+        else:
+            # filter with pre-roll from zero state:
+            if self.sos is not None:
+                self.zi = np.zeros((len(self.sos), 2, self.channels))
+            super().load_buffer(offset, nframes, buffer)
+        self.zi_offset = offset + nframes
+        self.zi_channels = np.array(self.compute_channels)
+
+
     def process(self, source, dest, nbefore):
         if self.sos is None:
             dest[:, :] = source[nbefore:, :]
-        else:
-            for c in range(self.channels):
-                dest[:, c] = sosfilt(self.sos, source[:, c],)[nbefore:]
+            return
+        # filter state of the processed channels:
+        channels = self.channel_index()
+        zi = self.zi[:, :, channels]
+        if nbefore > 0:
+            # the pre-roll only sets the filter state:
+            _, zi = sosfilt(self.sos, source[:nbefore], axis=0, zi=zi)
+        dest[:, :], zi = sosfilt(self.sos, source[nbefore:], axis=0, zi=zi)
+        self.zi[:, :, channels] = zi
 
             
     def update(self):
+        self.cancel_recompute()
         if self.highpass_cutoff < 0.001*self.rate/2 and \
            self.lowpass_cutoff >= self.rate/2 - 1e-8:
             self.sos = None
@@ -50,5 +88,6 @@ class BufferedFilter(BufferedData):
             self.sos = butter(self.filter_order,
                               (self.highpass_cutoff, self.lowpass_cutoff),
                               'bandpass', fs=self.rate, output='sos')
+        self.zi_offset = -1
         self.recompute_all()
 
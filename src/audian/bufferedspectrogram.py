@@ -11,6 +11,10 @@ from .buffereddata import BufferedData
 
 class BufferedSpectrogram(BufferedData):
 
+    settings = ('nfft', 'hop')
+    shared_attributes = BufferedData.shared_attributes + \
+        ('frequencies', 'spec_rect')
+
     def __init__(self, name='spectrogram', source='filtered',
                  panel='spectrogram', nfft=256,
                  overlap_frac=0.5):
@@ -81,6 +85,7 @@ class BufferedSpectrogram(BufferedData):
 
         
     def update(self, nfft=None, overlap_frac=None):
+        self.cancel_recompute()
         spec_update = False
         if nfft is not None:
             if nfft < 8:
@@ -0,0 +1,208 @@
+"""ChannelLoader
+
+Load only the displayed channels of the raw data.
+
+Audio files store the channels of each frame next to each other, such
+that the backends always decode all channels. The decoded frames are
+read in chunks of `chunk_time` seconds into a small scratch buffer,
+and only the active channels are unwrapped and copied into the
+buffer. The buffer is allocated column-major. Memory of channels that
+are never loaded is not touched and thus not allocated by the
+operating system.
+
+Inactive channels are loaded into the current buffer on demand via
+`load_channels()`. Frames of any channel are read independently of
+the buffer via `read()`, e.g. for saving a region.
+
+The buffer holds the data in the floating point type `dtype`, single
+precision by default.
+"""
+
+import numpy as np
+
+from audioio import unwrap
+
+
+class ChannelLoader:
+
+    chunk_time = 1.0
+    enabled = True
+    dtype = np.dtype(np.float32)
+
+    def __init__(self, data):
+        """Load only the active channels of some data.
+
+        Replaces the `load_buffer()`, `allocate_buffer()`, and
+        `_recycle_buffer()` functions of `data`.
+
+        Parameters
+        ----------
+        data: DataLoader
+            The raw data.
+        """
+        self.data = data
+        self.active = np.ones(data.channels, dtype=bool)
+        self.loaded = np.ones(data.channels, dtype=bool)
+        self.load_file = self.data.load_buffer
+        self.data.load_buffer = self.load_buffer
+        self.data.allocate_buffer = self.allocate_buffer
+        self.data._recycle_buffer = self._recycle_buffer
+
+
+    def set_active(self, channels=None):
+        """Set the channels that are loaded.
+
+        Channels that are not yet in the buffer are loaded right
+        away.
+
+        Parameters
+        ----------
+        channels: None or list of int
+            Indices of the channels to be loaded. All if None.
+            All channels are loaded if the buffer holds the whole
+            file.
+        """
+        if not self.enabled or channels is None or \
+           self.data.bufferframes >= self.data.frames:
+            self.active[:] = True
+        else:
+            self.active[:] = False
+            self.active[channels] = True
+        self.load_channels(np.nonzero(self.active)[0])
+
+
+    def load_channels(self, channels):
+        """Load channels into the current buffer if not already loaded.
+
+        Parameters
+        ----------
+        channels: list of int
+            Indices of the channels.
+        """
+        channels = [c for c in channels if not self.loaded[c]]
+        if len(channels) == 0:
+            return
+        if len(self.data.buffer) > 0:
+            data = self.read_channels(self.data.offset,
+                                      len(self.data.buffer), channels)
+            for k, c in enumerate(channels):
+                self.data.buffer[:, c] = data[:, k]
+        self.loaded[channels] = True
+
+
+    def read(self, start, stop, channels):
+        """Read frames of some channels.
+
+        Parameters
+        ----------
+        start: int
+            Index of the first frame.
+        stop: int
+            Index after the last frame.
+        channels: list of int
+            Indices of the channels.
+
+        Returns
+        -------
+        data: 2-D array
+            Frames of the requested channels.
+        """
+        offset = self.data.offset
+        if start >= offset and stop <= offset + len(self.data.buffer) and \
+           np.all(self.loaded[channels]):
+            return self.data.buffer[start - offset:stop - offset, channels]
+        return self.read_channels(start, stop - start, channels)
+
+
+    def read_channels(self, offset, nframes, channels):
+        """Decode frames from file and unwrap some of their channels.
+
+        Parameters
+        ----------
+        offset: int
+            Index of the first frame.
+        nframes: int
+            Number of frames.
+        channels: list of int
+            Indices of the channels.
+
+        Returns
+        -------
+        data: 2-D array
+            The frames of the requested channels.
+        """
+        data = np.empty((nframes, len(channels)), self.dtype)
+        nchunk = max(1, int(self.chunk_time*self.data.rate))
+        scratch = np.empty((min(nchunk, nframes), self.data.channels))
+        for i in range(0, nframes, nchunk):
+            n = min(nchunk, nframes - i)
+            self.data.load_audio_buffer(offset + i, n, scratch[:n])
+            data[i:i + n] = scratch[:n, channels]
+        # as in AudioLoader._load_buffer_unwrap():
+        if self.data.unwrap:
+            unwrap(data, self.data.unwrap_thresh, self.data.unwrap_ampl)
+            if self.data.unwrap_clips:
+                data[data > self.data.ampl_max] = self.data.ampl_max
+                data[data < self.data.ampl_min] = self.data.ampl_min
+            elif self.data.unwrap_down_scale:
+                data *= 0.5
+        return data
+
+
+    def load_buffer(self, offset, nframes, buffer):
+        """Load the active channels into the buffer.
+
+        Replaces the `load_buffer()` function of the data.
+        """
+        if np.all(self.active):
+            self.load_file(offset, nframes, buffer)
+        else:
+            channels = np.nonzero(self.active)[0]
+            data = self.read_channels(offset, nframes, channels)
+            for k, c in enumerate(channels):
+                buffer[:, c] = data[:, k]
+        self.loaded[:] = self.active
+
+
+    def allocate_buffer(self, nframes=None, force=False):
+        """Allocate a column-major buffer with `dtype`.
+
+        Replaces `BufferedArray.allocate_buffer()`.
+        """
+        data = self.data
+        if data.bufferframes > data.frames:
+            data.bufferframes = data.frames
+            data.backframes = 0
+        if nframes is None:
+            nframes = data.bufferframes
+        if nframes == 0:
+            return
+        if force or nframes != len(data.buffer) or \
+           data.shape[1:] != data.buffer.shape[1:] or \
+           data.buffer.dtype != self.dtype:
+            shape = list(data.shape)
+            shape[0] = nframes
+            data.buffer = np.empty(shape, self.dtype, order='F')
+
+
+    def _recycle_buffer(self, offset, nframes):
+        """Move the active channels of the buffer to their new position.
+
+        Replaces `BufferedArray._recycle_buffer()`.
+        """
+        data = self.data
+        buffer = data.buffer
+        o0 = max(offset, data.offset)
+        o1 = min(offset + nframes, data.offset + len(buffer))
+        self.allocate_buffer(nframes)
+        # inactive channels are not recycled:
+        self.loaded &= self.active
+        if o1 <= o0 or (o0 > offset and o1 < offset + nframes):
+            # new buffer is somewhere else or larger than current buffer:
+            return offset, nframes
+        for c in np.nonzero(self.active)[0]:
+            data.buffer[o0 - offset:o1 - offset, c] = \
+                buffer[o0 - data.offset:o1 - data.offset, c]
+        if o0 == offset:
+            return o1, offset + nframes - o1
+        return offset, o0 - offset
@@ -1,31 +1,186 @@
 """CompressedData
 
-Handle compressed and cached data for FullTracePlot.
+Handle compressed and cached data for FullTracePlot and TraceItem.
+
+Minima and maxima of the raw data are computed for a pyramid of
+levels with increasing steps. All levels are stored in a single
+memory-mappable numpy file in the user's cache directory. Cached
+files are identified by size, modification time, and content of the
+data files.
+
+Blocks of the finer levels are written to the cache file while they
+are computed, and completed blocks are flagged in an accompanying
+`-blocks.npy` file. An interrupted computation is resumed from the
+missing blocks.
+
+Along with the minima and maxima, the workers compute a coarse
+spectrogram of the full data. It is stored in a `-spec.npy` file next
+to the cache file.
 """
 
 import os
 import sys
+import glob
 import json
+import hashlib
 import argparse
-import ctypes as c
 import numpy as np
 
 from pathlib import Path
 from datetime import datetime
-from multiprocessing import Process, Array, set_start_method
+from multiprocessing import Process, Queue, set_start_method
 
 from audioio import AudioLoader
-from audioio import load_audio, write_audio
 from audioio.audioconverter import parse_load_kwargs
 from thunderlab.dataloader import DataLoader
+from thunderlab.powerspectrum import spectrogram
 
 from .version import __version__, __year__, audian_dirs
 
 
-def down_sample_worker(proc_idx, num_proc, nblock, step, array,
+def file_identity(file_paths, nbytes=0x4000):
+    """Identity of data files.
+
+    Parameters
+    ----------
+    file_paths: list of str or Path
+        Paths of the data files.
+    nbytes: int
+        Number of bytes from the beginning and the end of each file
+        that are included into the hash.
+
+    Returns
+    -------
+    identity: str
+        Hash over size, modification time, and content of the files.
+    """
+    sha = hashlib.sha1()
+    for fp in file_paths:
+        fp = Path(fp)
+        stat = fp.stat()
+        sha.update(f'{stat.st_size}:{stat.st_mtime_ns}'.encode())
+        if fp.is_file():
+            with fp.open('rb') as sf:
+                sha.update(sf.read(nbytes))
+                if stat.st_size > 2*nbytes:
+                    sf.seek(-nbytes, os.SEEK_END)
+                    sha.update(sf.read(nbytes))
+    return sha.hexdigest()
+
+
+def reduce_level(datas, steps, rows, k, start, stop):
+    """Compute minima and maxima of a level from the next finer level.
+
+    Parameters
+    ----------
+    datas: 2D ndarray
+        Alternating minima and maxima of all levels (rows)
+        for each channel (columns).
+    steps: list of int
+        Number of frames per segment of each level.
+    rows: list of int
+        Index of the first row of each level in `datas`.
+    k: int
+        Index of the level to be computed. Must be larger than zero.
+    start: int
+        First frame to be covered. Multiple of `steps[k]`.
+    stop: int
+        Frame after the last frame to be covered.
+    """
+    j0 = start//steps[k]
+    j1 = (stop + steps[k] - 1)//steps[k]
+    l0 = start//steps[k - 1]
+    l1 = (stop + steps[k - 1] - 1)//steps[k - 1]
+    lower = datas[rows[k - 1] + 2*l0:rows[k - 1] + 2*l1]
+    segments = np.arange(0, l1 - l0, steps[k]//steps[k - 1])
+    np.minimum.reduceat(lower[0::2], segments,
+                        out=datas[rows[k] + 2*j0:rows[k] + 2*j1:2])
+    np.maximum.reduceat(lower[1::2], segments,
+                        out=datas[rows[k] + 2*j0 + 1:rows[k] + 2*j1:2])
+
+    
+def reduce_block(buffer, index, datas, steps, rows, nlevels, scale):
+    """Compute minima and maxima of a block of data.
+
+    Parameters
+    ----------
+    buffer: 2D ndarray
+        Block of data (frames x channels).
+    index: int
+        Index of the first frame of the block.
+        Multiple of `steps[nlevels - 1]`.
+    datas: 2D ndarray
+        Alternating minima and maxima of all levels (rows)
+        for each channel (columns).
+    steps: list of int
+        Number of frames per segment of each level.
+    rows: list of int
+        Index of the first row of each level in `datas`.
+    nlevels: int
+        Number of levels to be computed from the block.
+    scale: float
+        Amplitude corresponding to one unit of integer `datas`.
+    """
+    segments = np.arange(0, len(buffer), steps[0])
+    i0 = rows[0] + 2*(index//steps[0])
+    i1 = i0 + 2*len(segments)
+    if np.issubdtype(datas.dtype, np.integer):
+        datas[i0:i1:2] = np.round(np.minimum.reduceat(buffer, segments)/scale)
+        datas[i0 + 1:i1:2] = np.round(np.maximum.reduceat(buffer, segments)/scale)
+    else:
+        np.minimum.reduceat(buffer, segments, out=datas[i0:i1:2])
+        np.maximum.reduceat(buffer, segments, out=datas[i0 + 1:i1:2])
+    for k in range(1, nlevels):
+        reduce_level(datas, steps, rows, k, index, index + len(buffer))
+
+
+def reduce_spectrum(buffer, index, rate, specs, step, nfft):
+    """Compute a coarse spectrogram of a block of data.
+
+    The power spectra of non-overlapping windows of `nfft` frames
+    are averaged over segments of `step` frames.
+
+    Parameters
+    ----------
+    buffer: 2D ndarray
+        Block of data (frames x channels).
+    index: int
+        Index of the first frame of the block. Multiple of `step`.
+    rate: float
+        Sampling rate of the data in Hertz.
+    specs: 3D ndarray
+        Power spectral densities of all segments (rows) for each
+        channel and frequency.
+    step: int
+        Number of frames per segment. Multiple of `nfft`.
+    nfft: int
+        Number of frames used for computing a single power spectrum.
+    """
+    n = len(buffer)//nfft*nfft
+    if n == 0:
+        return
+    freqs, times, power = spectrogram(buffer[:n], rate,
+                                      freq_resolution=None,
+                                      overlap_frac=None, n_fft=nfft,
+                                      n_overlap=0)
+    segments = np.arange(0, power.shape[1], step//nfft)
+    counts = np.diff(np.append(segments, power.shape[1]))
+    power = np.add.reduceat(power, segments, axis=1)/counts[:, None]
+    j0 = index//step
+    specs[j0:j0 + len(segments)] = power.transpose(1, 2, 0)
+
+    
+def down_sample_worker(chunks, nblock, steps, rows, nlevels, scale,
+                       datas_path, done_path, specs_path, spec_step, spec_nfft,
                        file_paths, tbuffer, rate, channels, unit, amax,
                        end_indices, unwrap_thresh, unwrap_clips, load_kwargs):
-    """ Worker for prepare() """
+    """ Worker for start()
+
+    Takes chunks of successive blocks from the `chunks` queue until it
+    gets None. Blocks are disjoint and are written without locking.
+    Readers only access blocks that are flagged in `done`.
+    The coarse spectrogram is only computed if `specs_path` is not None.
+    """
     if end_indices is None:
         data = DataLoader(file_paths, tbuffer, 0,
                           verbose=0, **load_kwargs)
@@ -35,21 +190,27 @@ def down_sample_worker(proc_idx, num_proc, nblock, step, array,
                           unit=unit, amax=amax, end_indices=end_indices,
                           **load_kwargs)
     data.set_unwrap(unwrap_thresh, unwrap_clips, False, data.unit)
-    datas = np.frombuffer(array.get_obj()).reshape((-1, data.channels))
+    datas = np.load(datas_path, mmap_mode='r+')
+    done = np.load(done_path, mmap_mode='r+')
+    specs = None
+    if specs_path is not None:
+        specs = np.load(specs_path, mmap_mode='r+')
     buffer = np.zeros((nblock, data.channels))
-    segments = np.arange(0, len(buffer), step)
-    for index in range(proc_idx*nblock, data.frames, num_proc*nblock):
-        if data.frames - index < nblock:
-            nblock = data.frames - index
-            buffer = buffer[:nblock, :]
-            segments = np.arange(0, len(buffer), step)
-        data.load_buffer(index, nblock, buffer)
-        i = 2*index//step
-        with array.get_lock():
-            np.minimum.reduceat(buffer, segments,
-                                out=datas[i + 0:i + 0 + 2*len(segments):2])
-            np.maximum.reduceat(buffer, segments,
-                                out=datas[i + 1:i + 1 + 2*len(segments):2])
+    for chunk in iter(chunks.get, None):
+        for block in chunk:
+            index = block*nblock
+            n = min(nblock, data.frames - index)
+            data.load_buffer(index, n, buffer[:n])
+            reduce_block(buffer[:n], index, datas, steps, rows,
+                         nlevels, scale)
+            if specs is not None:
+                reduce_spectrum(buffer[:n], index, data.rate, specs,
+                                spec_step, spec_nfft)
+                specs.flush()
+            # mark block as completed only after its data are on disk:
+            datas.flush()
+            done[block] = True
+            done.flush()
     return None
 
 
@@ -57,14 +218,37 @@ class CompressedData:
 
     fulltraces_file = 'fulltraces.json'
     max_files = 1000
+    min_step = 64
+    base = 4
+    max_segments = 2**22
+    min_segments = 256
+    block_time = 30.0
+    chunk_blocks = 8
+    workers = 0
+    spec_bins = 2048
+    spec_nfft = 512
     
-    def __init__(self, data): #, files, load_kwargs, unwrap, unwrap_clip):
+    def __init__(self, data):
         self.data = data
         self.procs = []
-        self.shared_array = None
-        self.times = None
+        self.queue = None
         self.datas = None
+        self.done = None
+        self.cache_name = None
+        self.identity = None
+        self.dtype = np.dtype(np.float32)
+        self.scale = 1.0
+        self.steps = []
+        self.counts = []
+        self.rows = []
+        self.block_levels = 1
+        self.nblock = 0
+        self.specs = None
+        self.spec_step = 0
+        self.spec_count = 0
         self.short_data = True
+        self.complete = False
+        self.saved = False
 
     def __del__(self):
         self.close()
@@ -75,42 +259,124 @@ class CompressedData:
             proc.join()
             proc.close()
         self.procs = []
+        self.queue = None
+        # completed blocks are already in the cache file:
+        if self.done is not None:
+            self.done.flush()
 
-    def start(self, max_pixel, load_kwargs, do_short=True):
-        if self.times is not None and self.datas is not None:
+    def setup_levels(self):
+        """Steps, number of segments, and rows of all levels.
+
+        The finest level has at least `min_step` frames per segment
+        and not more than `max_segments` segments. Successive levels
+        increase the step by `base`, until a level has no more than
+        `min_segments` segments.
+
+        The segments of the coarse spectrogram are the ones of the
+        coarsest level with at least `spec_bins` segments that is
+        computed blockwise. They span at least `spec_nfft` frames.
+        """
+        frames = int(self.data.frames)
+        step = self.min_step
+        while frames > step*self.max_segments:
+            step *= self.base
+        self.steps = []
+        self.counts = []
+        self.rows = []
+        row = 0
+        while True:
+            n = (frames + step - 1)//step
+            self.steps.append(step)
+            self.counts.append(n)
+            self.rows.append(row)
+            row += 2*n
+            if n <= self.min_segments:
+                break
+            step *= self.base
+        # levels that are computed blockwise:
+        nblock = int(self.block_time*self.data.rate)
+        self.block_levels = max(1, len([s for s in self.steps if s <= nblock]))
+        step = self.steps[self.block_levels - 1]
+        self.nblock = max(step, nblock//step*step)
+        # coarse spectrogram:
+        self.spec_step = 0
+        self.spec_count = 0
+        for s, n in zip(self.steps[:self.block_levels],
+                        self.counts[:self.block_levels]):
+            if s >= self.spec_nfft and \
+               (self.spec_step == 0 or n >= self.spec_bins):
+                self.spec_step = s
+                self.spec_count = n
+        # encoding:
+        self.dtype = np.dtype(np.float32)
+        self.scale = 1.0
+        if not self.data.unwrap and \
+           self.data.encoding in ['PCM_16', 'PCM_S8', 'PCM_U8']:
+            self.dtype = np.dtype(np.int16)
+            self.scale = self.data.ampl_max/2**15
+
+    def start(self, load_kwargs, do_short=True):
+        """Compute compressed data.
+
+        Short data are computed right away in memory. For long data,
+        background processes compute the blocks that are still missing
+        in the cache file. Call `load_data()` before to resume an
+        interrupted computation.
+        """
+        if self.complete or len(self.procs) > 0:
             return
-        self.procs = []
-        step = max(1, self.data.frames//max_pixel)
-        nblock = max(step, int(30.0*self.data.rate//step)*step)
+        if self.datas is None:
+            self.setup_levels()
+        nrows = self.rows[-1] + 2*self.counts[-1]
         end_indices = None
         if len(self.data.file_paths) > 1:
             end_indices = self.data.end_indices
-        self.times = np.arange(0, self.data.frames + step - 1,
-                               step/2)/self.data.rate
         if len(self.data.buffer) == self.data.frames:
             # short file, do not compress in background:
             self.short_data = True
             if do_short:
-                segments = np.arange(0, self.data.frames, step)
-                self.datas = np.zeros((1 + 2*len(segments),
-                                       self.data.channels))
-                np.minimum.reduceat(self.data.buffer, segments,
-                                    out=self.datas[0:0 + 2*len(segments):2])
-                np.maximum.reduceat(self.data.buffer, segments,
-                                    out=self.datas[1:1 + 2*len(segments):2])
+                self.datas = np.zeros((nrows, self.data.channels),
+                                      dtype=self.dtype)
+                reduce_block(self.data.buffer, 0, self.datas, self.steps,
+                             self.rows, len(self.steps), self.scale)
+                self.specs = None
+                if self.spec_step > 0:
+                    self.specs = np.zeros(self.spec_shape(), np.float32)
+                    reduce_spectrum(self.data.buffer, 0, self.data.rate,
+                                    self.specs, self.spec_step,
+                                    self.spec_nfft)
+                self.complete = True
             return
         # compress in background:        
         self.short_data = False
-        self.shared_array = Array(c.c_double, len(self.times)*self.data.channels)
-        self.datas = np.frombuffer(self.shared_array.get_obj())
-        self.datas = self.datas.reshape((len(self.times), self.data.channels))
-        nprocs = os.cpu_count() - 1
-        for i in range(max(1, nprocs)):
+        self.saved = False
+        if self.datas is None:
+            self.create_cache()
+        blocks = np.flatnonzero(~self.done)
+        if len(blocks) == 0:
+            self.finish()
+            return
+        chunks = self.chunks(blocks)
+        nprocs = self.workers
+        if nprocs <= 0:
+            nprocs = max(1, os.cpu_count() - 1)
+        nprocs = min(nprocs, len(chunks))
+        self.queue = Queue()
+        for chunk in chunks:
+            self.queue.put(chunk)
+        for i in range(nprocs):
+            self.queue.put(None)
+        specs_path = None
+        if self.specs is not None:
+            specs_path = self.cache_path('-spec')
+        for i in range(nprocs):
             p = Process(target=down_sample_worker,
-                        args=(i, nprocs, nblock, step,
-                              self.shared_array,
+                        args=(self.queue, self.nblock, self.steps,
+                              self.rows, self.block_levels, self.scale,
+                              self.cache_path(), self.cache_path('-blocks'),
+                              specs_path, self.spec_step, self.spec_nfft,
                               self.data.file_paths,
-                              nblock/self.data.rate + 0.1,
+                              self.nblock/self.data.rate + 0.1,
                               self.data.rate, self.data.channels,
                               self.data.unit, self.data.ampl_max,
                               end_indices,
@@ -121,64 +387,409 @@ class CompressedData:
         for p in self.procs:
             p.start()
 
+    def chunks(self, blocks):
+        """Split blocks into chunks for the workers.
+
+        A chunk is a run of at most `chunk_blocks` successive blocks
+        that all start within the same data file.
+
+        Parameters
+        ----------
+        blocks: 1D ndarray of int
+            Sorted indices of the blocks to be computed.
+
+        Returns
+        -------
+        chunks: list of list of int
+            Block indices of each chunk.
+        """
+        files = np.zeros(len(blocks), dtype=int)
+        if len(self.data.file_paths) > 1:
+            files = np.searchsorted(self.data.end_indices,
+                                    blocks*self.nblock, side='right')
+        chunks = []
+        for i, block in enumerate(blocks):
+            if len(chunks) == 0 or len(chunks[-1]) >= self.chunk_blocks or \
+               block != chunks[-1][-1] + 1 or files[i] != files[i - 1]:
+                chunks.append([])
+            chunks[-1].append(int(block))
+        return chunks
+
+    def progress(self):
+        """Fraction of blocks that have been computed.
+        """
+        if self.complete:
+            return 1.0
+        if self.done is None or len(self.done) == 0:
+            return 0.0
+        return np.sum(self.done)/len(self.done)
+
+    def finish(self):
+        """Compute the levels that could not be computed blockwise.
+
+        Then mark the cache file as complete.
+        """
+        if not np.all(self.done):
+            return
+        for k in range(self.block_levels, len(self.steps)):
+            reduce_level(self.datas, self.steps, self.rows, k,
+                         0, self.data.frames)
+        self.complete = True
+        self.save_data()
+
     def wait(self):
         for p in self.procs:
             p.join()
         for p in self.procs:
             p.close()
+        if len(self.procs) > 0:
+            self.finish()
         self.procs = []
             
     def is_busy(self):
-        busy = False
         for proc in self.procs:
             if proc.is_alive():
-                busy = True
-                break
-        if not busy:
+                return True
+        if len(self.procs) > 0:
             for proc in self.procs:
                 proc.close()
             self.procs = []
-        return busy
+            self.finish()
+        return False
 
-    def get_lock(self):
-        lock = self.shared_array.get_lock()
-        return lock
+    def level(self, step):
+        """Index of the coarsest level that resolves a given step.
 
-    def save_data_local(self):
-        if self.short_data:
-            return
-        ft_path = self.data.filepath.with_name(self.data.filepath.stem + '-fulltrace.wav')
-        rate = 1/(self.times[1] - self.times[0])
-        rate *= 1e6
-        while rate > 2**31:
-            rate /= 1e3
-        write_audio(ft_path, self.datas, rate, format='WAV', encoding='DOUBLE')
+        Parameters
+        ----------
+        step: int
+            Number of frames per pixel.
 
-    def save_data(self):
-        if self.short_data:
-            return
-        audian_dirs.user_cache_path.mkdir(parents=True, exist_ok=True)
+        Returns
+        -------
+        level: int
+            Index of the level. -1 if no level is suitable.
+        """
+        k = -1
+        for i, s in enumerate(self.steps):
+            if s > step:
+                break
+            k = i
+        return k
+
+    def level_data(self, k):
+        """Times, minima, and maxima of a level.
+
+        Parameters
+        ----------
+        k: int
+            Index of the level.
+
+        Returns
+        -------
+        times: 1D ndarray
+            Times of the alternating minima and maxima.
+        datas: 2D ndarray
+            Alternating minima and maxima for each channel.
+        """
+        n = 2*self.counts[k]
+        times = np.arange(n)*(self.steps[k]/2)/self.data.rate
+        datas = self.datas[self.rows[k]:self.rows[k] + n]*self.scale
+        return times, datas
+
+    def update_level_data(self, k, datas, drawn):
+        """Copy minima and maxima of newly completed blocks.
+
+        Only blocks that are flagged as completed are read. They are
+        not written anymore, so no locking is needed.
+
+        Parameters
+        ----------
+        k: int
+            Index of the level. Must be smaller than `block_levels`.
+        datas: 2D ndarray
+            Alternating minima and maxima for each channel of the
+            level as returned by `level_data()`. Newly completed
+            blocks are copied into this array.
+        drawn: 1D ndarray of bool
+            For each block, whether it already has been copied
+            into `datas`. Updated for the newly copied blocks.
+
+        Returns
+        -------
+        changed: bool
+            True if new blocks have been copied into `datas`.
+        """
+        if self.done is None:
+            return False
+        blocks = np.flatnonzero(np.asarray(self.done) & ~drawn)
+        step = self.steps[k]
+        for block in blocks:
+            j0 = block*self.nblock//step
+            j1 = min(((block + 1)*self.nblock + step - 1)//step,
+                     self.counts[k])
+            datas[2*j0:2*j1] = self.datas[self.rows[k] + 2*j0:
+                                          self.rows[k] + 2*j1]*self.scale
+        drawn[blocks] = True
+        return len(blocks) > 0
+
+    def update_spec_segments(self, drawn):
+        """Segments of the coarse spectrogram of newly completed blocks.
+
+        Like `update_level_data()`, only blocks that are flagged as
+        completed are considered. Once the compressed data are
+        complete, all blocks are.
+
+        Parameters
+        ----------
+        drawn: 1D ndarray of bool
+            For each block, whether its segments already have been
+            drawn. Updated for the newly completed blocks.
+
+        Returns
+        -------
+        segments: list of tuple of int
+            Index of the first and after the last segment of each
+            newly completed block.
+        """
+        if self.specs is None or self.spec_step <= 0:
+            return []
+        if self.complete:
+            done = np.ones(len(drawn), dtype=bool)
+        elif self.done is None:
+            return []
+        else:
+            done = np.asarray(self.done)
+        blocks = np.flatnonzero(done & ~drawn)
+        step = self.spec_step
+        segments = []
+        for block in blocks:
+            j0 = block*self.nblock//step
+            j1 = min(((block + 1)*self.nblock + step - 1)//step,
+                     len(self.specs))
+            if j1 > j0:
+                segments.append((j0, j1))
+        drawn[blocks] = True
+        return segments
+
+    def spec_shape(self):
+        """Shape of the coarse spectrogram.
+
+        Segments x channels x frequencies.
+        """
+        return (self.spec_count, self.data.channels, self.spec_nfft//2 + 1)
+
+    def spec_data(self, channel):
+        """Coarse spectrogram of a channel.
+
+        Segments that have not been computed yet are zero.
+
+        Parameters
+        ----------
+        channel: int
+            The channel.
+
+        Returns
+        -------
+        times: 1D ndarray
+            Start times of the segments.
+        freqs: 1D ndarray
+            Frequencies of the power spectra.
+        power: 2D ndarray
+            Power spectral densities (segments x frequencies).
+            None if no coarse spectrogram is available.
+        """
+        if self.specs is None:
+            return None, None, None
+        times = np.arange(len(self.specs))*self.spec_step/self.data.rate
+        freqs = np.arange(self.specs.shape[2])*self.data.rate/self.spec_nfft
+        return times, freqs, np.asarray(self.specs[:, channel, :])
+
+    def downsample(self, start, stop, step, channel):
+        """Minima and maxima of consecutive segments.
+
+        Same as `MinMaxPyramid.downsample()`, but for the full data.
+
+        Parameters
+        ----------
+        start: int
+            Index of first requested frame.
+        stop: int
+            Index of the frame after the last requested one.
+        step: int
+            Number of frames per segment. Must not be smaller
+            than the step of the finest level.
+            All levels need to be `complete`.
+        channel: int
+            The channel.
+
+        Returns
+        -------
+        start: int
+            Index of the first frame of the first segment.
+        step: int
+            Number of frames per segment. A multiple of the
+            step of the level used for downsampling.
+        data: ndarray
+            Alternating minima and maxima of the segments.
+        """
+        k = self.level(step)
+        lstep = self.steps[k]
+        n = step//lstep
+        step = n*lstep
+        j0 = max(0, start//step*n)
+        j1 = min(stop//step*n + n, self.counts[k])
+        if j1 <= j0:
+            return j0*lstep, step, np.zeros(0)
+        level = self.datas[self.rows[k] + 2*j0:self.rows[k] + 2*j1, channel]
+        segments = np.arange(0, j1 - j0, n)
+        data = np.empty(2*len(segments))
+        np.minimum.reduceat(level[0::2], segments, out=data[0::2])
+        np.maximum.reduceat(level[1::2], segments, out=data[1::2])
+        if self.scale != 1:
+            data *= self.scale
+        return j0*lstep, step, data
+
+    def properties(self):
+        """Properties describing the compressed data.
+        """
+        if self.identity is None:
+            self.identity = file_identity(self.data.file_paths)
+        first_file = Path(self.data.file_paths[0]).absolute()
+        last_file = Path(self.data.file_paths[-1]).absolute()
+        return dict(first=os.fspath(first_file),
+                    last=os.fspath(last_file),
+                    identity=self.identity,
+                    unwrap=[self.data.unwrap_thresh, self.data.unwrap_clips],
+                    rate=float(self.data.rate),
+                    frames=int(self.data.frames),
+                    channels=int(self.data.channels),
+                    dtype=self.dtype.name,
+                    scale=self.scale,
+                    steps=self.steps,
+                    counts=self.counts,
+                    rows=self.rows,
+                    block_levels=self.block_levels,
+                    nblock=self.nblock,
+                    spec_step=self.spec_step,
+                    spec_count=self.spec_count,
+                    spec_nfft=self.spec_nfft,
+                    complete=self.complete)
+
+    def matches(self, props):
+        """Check whether stored properties match the data.
+        """
+        return props.get('identity') == self.identity and \
+            props.get('unwrap') == [self.data.unwrap_thresh,
+                                    self.data.unwrap_clips] and \
+            props.get('frames') == self.data.frames and \
+            props.get('channels') == self.data.channels
+
+    def map_file(self, file_path, props):
+        """Memory map a file with compressed data.
+
+        Incomplete files are mapped for writing together with the
+        flags of the completed blocks and the coarse spectrogram,
+        such that the missing blocks can be computed by `start()`.
+        A missing coarse spectrogram of a complete file is fine.
+
+        Returns
+        -------
+        success: bool
+            True if file was successfully mapped.
+        """
+        complete = props.get('complete', True)
+        try:
+            datas = np.load(file_path, mmap_mode='r' if complete else 'r+')
+            done = None
+            if not complete:
+                done_path = file_path.with_name(file_path.stem + '-blocks.npy')
+                done = np.load(done_path, mmap_mode='r+')
+        except (OSError, ValueError) as e:
+            print(e)
+            return False
+        nrows = props['rows'][-1] + 2*props['counts'][-1]
+        if datas.shape != (nrows, self.data.channels):
+            return False
+        specs = None
+        spec_step = props.get('spec_step', 0)
+        spec_count = props.get('spec_count', 0)
+        spec_nfft = props.get('spec_nfft', self.spec_nfft)
+        if spec_step > 0:
+            specs_path = file_path.with_name(file_path.stem + '-spec.npy')
+            try:
+                specs = np.load(specs_path,
+                                mmap_mode='r' if complete else 'r+')
+            except (OSError, ValueError) as e:
+                if not complete:
+                    print(e)
+                    return False
+            if specs is not None and \
+               specs.shape != (spec_count, self.data.channels,
+                               spec_nfft//2 + 1):
+                if not complete:
+                    return False
+                specs = None
+        if specs is None:
+            spec_step = 0
+            spec_count = 0
+        self.specs = specs
+        self.spec_step = spec_step
+        self.spec_count = spec_count
+        self.spec_nfft = spec_nfft
+        self.datas = datas
+        self.done = done
+        self.dtype = datas.dtype
+        self.scale = props['scale']
+        self.steps = props['steps']
+        self.counts = props['counts']
+        self.rows = props['rows']
+        self.block_levels = props.get('block_levels', len(self.steps))
+        self.nblock = props.get('nblock', 0)
+        self.short_data = False
+        self.complete = complete
+        self.saved = complete
+        return True
+
+    def load_cache(self):
+        """Index of files in the user's cache directory.
+        """
         files = {}
         ft_path = audian_dirs.user_cache_path / CompressedData.fulltraces_file
         if ft_path.exists():
             with ft_path.open() as sf:
                 files = json.load(sf)
+        return files
+
+    def save_cache(self, files):
+        """Write index of files to the user's cache directory.
+        """
+        ft_path = audian_dirs.user_cache_path / CompressedData.fulltraces_file
+        with ft_path.open('w') as df:
+            json.dump(files, df, indent=4)
+
+    def cache_path(self, suffix=''):
+        """Path of the cache file of the compressed data.
+        """
+        stem = Path(self.cache_name).stem
+        return audian_dirs.user_cache_path / (stem + suffix + '.npy')
+        
+    def create_cache(self):
+        """Allocate the cache file and the flags of completed blocks.
+        """
+        audian_dirs.user_cache_path.mkdir(parents=True, exist_ok=True)
+        files = self.load_cache()
         # new filename:
-        ft_name = f'{1:08X}-fulltrace.wav'
+        ft_name = f'{1:08X}-fulltrace.npy'
         for k in range(1, CompressedData.max_files + 10):
-            ft_name = f'{k:08X}-fulltrace.wav'
+            ft_name = f'{k:08X}-fulltrace.npy'
             if not ft_name in files.keys():
                 break
         # add to dictionary:
-        first_file = Path(self.data.file_paths[0]).absolute()
-        last_file = Path(self.data.file_paths[-1]).absolute()
         timestamp = datetime.now().isoformat()
-        rate = 1/(self.times[1] - self.times[0])
-        ft_props = dict(first=os.fspath(first_file),
-                        last=os.fspath(last_file),
-                        rate=rate,
-                        created=timestamp,
-                        used=timestamp)
+        ft_props = self.properties()
+        ft_props['created'] = timestamp
+        ft_props['used'] = timestamp
         files[ft_name] = ft_props
         # remove old files:
         if len(files) > CompressedData.max_files:
@@ -186,66 +797,119 @@ class CompressedData:
             timestamps = [files[ftf]['used'] for ftf in ft_files]
             idx = np.argsort(timestamps)
             for i in idx[:len(ft_files) - CompressedData.max_files]:
-                try:
-                    (audian_dirs.user_cache_path / ft_files[i]).unlink()
-                except Exception as e:
-                    print(e)
+                ft_file_path = audian_dirs.user_cache_path / ft_files[i]
+                blocks_path = ft_file_path.with_name(ft_file_path.stem +
+                                                     '-blocks.npy')
+                specs_path = ft_file_path.with_name(ft_file_path.stem +
+                                                    '-spec.npy')
+                for path in [ft_file_path, blocks_path, specs_path]:
+                    try:
+                        path.unlink(missing_ok=True)
+                    except Exception as e:
+                        print(e)
                 files.pop(ft_files[i])
-        # save json file:
-        with ft_path.open('w') as df:
-            json.dump(files, df, indent=4)
-        # save file:
-        rate *= 1e6
-        while rate > 2**31:
-            rate /= 1e3
-        write_audio(audian_dirs.user_cache_path / ft_name,
-                    self.datas, rate, format='WAV', encoding='DOUBLE')
+        # allocate files:
+        self.cache_name = ft_name
+        nrows = self.rows[-1] + 2*self.counts[-1]
+        self.datas = np.lib.format.open_memmap(self.cache_path(), 'w+',
+                                               self.dtype,
+                                               (nrows, self.data.channels))
+        nblocks = (self.data.frames + self.nblock - 1)//self.nblock
+        self.done = np.lib.format.open_memmap(self.cache_path('-blocks'),
+                                              'w+', bool, (nblocks,))
+        self.specs = None
+        if self.spec_step > 0:
+            self.specs = np.lib.format.open_memmap(self.cache_path('-spec'),
+                                                   'w+', np.float32,
+                                                   self.spec_shape())
+            self.specs.flush()
+        self.datas.flush()
+        self.done.flush()
+        self.save_cache(files)
+
+    def save_data_local(self):
+        if self.short_data or not self.complete:
+            return
+        ft_path = self.data.filepath.with_name(self.data.filepath.stem + '-fulltrace.npy')
+        np.save(ft_path, self.datas)
+        if self.specs is not None:
+            np.save(ft_path.with_name(ft_path.stem + '-spec.npy'),
+                    self.specs)
+        props = self.properties()
+        props['created'] = datetime.now().isoformat()
+        with ft_path.with_suffix('.json').open('w') as df:
+            json.dump(props, df, indent=4)
+
+    def save_data(self):
+        """Mark the cache file as complete.
+
+        The data have been written to the cache file while they have
+        been computed. The flags of the completed blocks are no longer
+        needed and the cache file is mapped read only.
+        """
+        if self.short_data or not self.complete or self.saved or \
+           self.cache_name is None:
+            return
+        self.datas.flush()
+        if self.specs is not None:
+            self.specs.flush()
+        files = self.load_cache()
+        ft_props = files.get(self.cache_name, self.properties())
+        ft_props['complete'] = True
+        ft_props['used'] = datetime.now().isoformat()
+        files[self.cache_name] = ft_props
+        self.save_cache(files)
+        self.done = None
+        try:
+            self.cache_path('-blocks').unlink(missing_ok=True)
+        except Exception as e:
+            print(e)
+        self.map_file(self.cache_path(), ft_props)
 
     def load_data(self):
-        self.times = None
+        """Map compressed data from a local file or the user's cache.
+
+        Incomplete data in the cache are mapped as well. Then `start()`
+        only needs to compute the missing blocks.
+        """
         self.datas = None
+        self.done = None
+        self.specs = None
+        self.cache_name = None
+        self.complete = False
+        self.identity = file_identity(self.data.file_paths)
         # load from folder of data file:
-        ft_path = self.data.filepath.with_name(self.data.filepath.stem + '-fulltrace.wav')
-        if ft_path.exists():
-            self.datas, rate = load_audio(ft_path)
-            rates = np.array([rate/1e6, rate/1e3, rate])
-            durations = len(self.datas)/rates
-            rate = rates[np.argmin(np.abs(durations - self.data.frames/self.data.rate))]
-            self.times = np.arange(len(self.datas))/rate
-            return
+        ft_path = self.data.filepath.with_name(self.data.filepath.stem + '-fulltrace.npy')
+        props_path = ft_path.with_suffix('.json')
+        if ft_path.exists() and props_path.exists():
+            with props_path.open() as sf:
+                props = json.load(sf)
+            props['complete'] = True
+            if self.matches(props) and self.map_file(ft_path, props):
+                return
         # load from user cache:
-        ft_path = audian_dirs.user_cache_path / CompressedData.fulltraces_file
-        if audian_dirs.user_cache_path.exists() and ft_path.exists():
-            # load json file:
-            files = {}
-            with ft_path.open() as sf:
-                files = json.load(sf)
-            # search for entry with matching source files:
-            first_file = Path(self.data.file_paths[0]).absolute()
-            last_file = Path(self.data.file_paths[-1]).absolute()
-            for ft_file in files.keys():
-                ft_props = files[ft_file]
-                if ft_props['first'] == os.fspath(first_file) and \
-                   ft_props['last'] == os.fspath(last_file):
-                    # load full trace data:
-                    ft_file_path = audian_dirs.user_cache_path / ft_file
-                    if not ft_file_path.is_file() or \
-                       ft_file_path.stat().st_size == 0:
-                        # remove file from json file:
-                        del files[ft_file]
-                        with ft_path.open('w') as df:
-                            json.dump(files, df, indent=4)
-                        break
-                    self.datas, rate = load_audio(ft_file_path)
-                    rate = ft_props['rate']
-                    self.times = np.arange(len(self.datas))/rate
-                    # update timestamp:
-                    timestamp = datetime.now().isoformat()
-                    ft_props['used'] = timestamp
-                    # save json file:
-                    with ft_path.open('w') as df:
-                        json.dump(files, df, indent=4)
+        if not audian_dirs.user_cache_path.exists():
+            return
+        files = self.load_cache()
+        # search for entry with matching source files:
+        for ft_file in files.keys():
+            ft_props = files[ft_file]
+            if self.matches(ft_props):
+                # load full trace data:
+                ft_file_path = audian_dirs.user_cache_path / ft_file
+                if not ft_file_path.is_file() or \
+                   not self.map_file(ft_file_path, ft_props):
+                    # remove file from json file:
+                    del files[ft_file]
+                    self.save_cache(files)
                     break
+                self.cache_name = ft_file
+                # update timestamp:
+                timestamp = datetime.now().isoformat()
+                ft_props['used'] = timestamp
+                # save json file:
+                self.save_cache(files)
+                break
 
 
 def main(cargs):
@@ -264,6 +928,9 @@ def main(cargs):
     parser.add_argument('-U', dest='unwrap_clip', default=0, type=float,
                         metavar='UNWRAP', const=1.5, nargs='?',
                         help='unwrap clipped data with threshold relative to maximum input range and clip using unwrap() from audioio package')
+    parser.add_argument('-j', dest='workers', default=0, type=int,
+                        metavar='WORKERS',
+                        help='number of worker processes (default: number of CPUs minus one)')
     parser.add_argument('files', nargs='+', default=[], type=str,
                         help='name of files with the time series data')
     args = parser.parse_args(cargs)
@@ -287,10 +954,12 @@ def main(cargs):
         files = args.files
 
     # compress:
+    CompressedData.workers = args.workers
     data = DataLoader(files, **load_kwargs)
     data.set_unwrap(args.unwrap, args.unwrap_clip, False, data.unit)
     compress = CompressedData(data)
-    compress.start(6000, load_kwargs)
+    compress.load_data()
+    compress.start(load_kwargs)
     compress.wait()
     compress.save_data_local()
     
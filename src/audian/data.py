@@ -6,9 +6,11 @@ and the time window shown.
 import numpy as np
 
 from audioio import get_datetime
-from thunderlab.dataloader import DataLoader
 
-from .bufferedspectrogram import BufferedSpectrogram
+from .datasource import DataView, open_source
+from .region import Region
+from .memorybudget import memory_budget
+from .recomputer import Recomputer
 
 
 class Data(object):
@@ -17,11 +19,18 @@ class Data(object):
         self.buffer_time = 60
         self.back_time = 20
         self.follow_time = 0
+        self.overview_time = 60
         self.file_path = file_path
         self.load_kwargs = kwargs
+        self.source = None
         self.data = None
+        self.channel_loader = None
+        self.prefetcher = None
+        self.recomputer = Recomputer()
+        self.released = False
         self.rate = None
         self.channels = 0
+        self.show_channels = None
         self.frames = 0
         self.start_time = None
         self.meta_data = {}
@@ -99,25 +108,81 @@ class Data(object):
         return changed
 
     
-    def get_region(self, t0, t1, channel):
-        traces = {}
-        for t in self.traces:
-            i0 = int(t0*t.rate)
-            if i0 < 0:
-                i0 = 0
-            i1 = int(t1*t.rate) + 1
-            if i1 > len(t):
-                i1 = len(t)
-            time = np.arange(i0, i1)/t.rate
-            data = t[i0:i1, channel]
-            if isinstance(t, BufferedSpectrogram):
-                freqs = t.frequencies
-                traces[t.name] = (time, freqs, data)
-            else:
-                traces[t.name] = (time, data)
-        return traces
+    def get_region(self, t0, t1, channel, names=None, channels=None):
+        """Traces of a selected region.
+
+        The data are computed only when accessed, without moving the
+        displayed buffers.
+
+        Parameters
+        ----------
+        t0: float
+            Start time of the region.
+        t1: float
+            End time of the region.
+        channel: int
+            The selected channel.
+        names: None or iterable of str
+            Names of the requested traces, case insensitive.
+            All if None.
+        channels: None or list of int
+            Channels that are computed together with `channel` for
+            analyzing all of them via `Region.select()`.
+
+        Returns
+        -------
+        region: Region
+            Mapping of the names of the requested traces to their
+            lazily evaluated data.
+
+        Raises
+        ------
+        KeyError:
+            A requested trace does not exist.
+        """
+        if names is None:
+            traces = list(self.traces)
+        else:
+            traces = [self[name] for name in names]
+            for name, trace in zip(names, traces):
+                if trace is None:
+                    raise KeyError(f'no trace named "{name}"')
+            traces = [t for t in self.traces if t in traces]
+        # buffers must not change while the region is set up:
+        self.recomputer.wait()
+        self.source.cancel()
+        region = Region(self, t0, t1, channel, traces, channels)
+        # recomputers only fill in invalid frames, the region reads
+        # valid frames of the buffers or its detached copies:
+        self.source.start()
+        return region
     
         
+    def read_frames(self, start, stop, channels=None):
+        """Raw data of any channels.
+
+        Also for channels that are not displayed and frames outside
+        the buffer. The buffer is not moved.
+
+        Parameters
+        ----------
+        start: int
+            Index of the first frame.
+        stop: int
+            Index after the last frame.
+        channels: None or list of int
+            Indices of the channels. All if None.
+
+        Returns
+        -------
+        data: 2-D array
+            The raw data of the requested frames and channels.
+        """
+        if channels is None:
+            channels = list(range(self.channels))
+        return self.channel_loader.read(start, stop, channels)
+
+    
     def setup_traces(self):
         """ order trace sequence.
         """
@@ -148,8 +213,11 @@ class Data(object):
 
         
     def open(self, unwrap, unwrap_clip):
-        if not self.data is None:
-            self.data.close()
+        self.recomputer.clear()
+        if not self.source is None:
+            self.fork_traces()
+            self.source.remove(self)
+            self.source = None
         # expand buffer times:
         self.tbefore = 0
         self.tafter = 0
@@ -167,17 +235,16 @@ class Data(object):
         # raw data:        
         tbuffer = self.buffer_time + self.tbefore + self.tafter
         tback = self.back_time + self.tbefore
-        verbose = isinstance(self.file_path, (list, tuple, np.ndarray))
         try:
-            self.data = DataLoader(self.file_path, tbuffer, tback,
-                                   verbose=verbose,
-                                   **self.load_kwargs)
+            self.source = open_source(self, self.file_path, tbuffer, tback,
+                                      self.load_kwargs, unwrap, unwrap_clip)
         except Exception as e:
             self.data = None
             if isinstance(self.file_path, (list, tuple, np.ndarray)):
                 self.file_path = self.file_path[0]
             raise e
-        self.data.set_unwrap(unwrap, unwrap_clip, False, self.data.unit)
+        # raw data are shared with other tabs showing the same files:
+        self.data = DataView(self.source.data)
         self.data.follow = int(self.follow_time*self.data.rate)
         self.data.name = 'data'
         self.data.panel = 'trace'
@@ -188,6 +255,9 @@ class Data(object):
         self.data.lw_thick = 2
         self.data.dests = []
         self.data.need_update = False
+        self.channel_loader = self.source.channel_loader
+        self.prefetcher = self.source.prefetcher
+        self.data.overview_time = self.overview_time
         self.traces.insert(0, self.data)
         self.sources = [None] + [i + 1 for i in self.sources]
         self.file_path = self.data.filepath
@@ -201,13 +271,148 @@ class Data(object):
         # derived data:
         for trace, source in zip(self.traces[1:], self.sources[1:]):
             trace.open(self.traces[source])
+        # further recomputations in the background:
+        for trace in self.traces[1:]:
+            trace.recomputer = self.recomputer
+        self.set_channels(self.show_channels)
         self.set_need_update()
+        self.released = False
+        memory_budget.touch(self)
                 
 
     def close(self):
-        if not self.data is None:
-            self.data.close()
+        memory_budget.remove(self)
+        self.recomputer.cancel()
+        if not self.source is None:
+            self.fork_traces()
+            self.source.remove(self)
+            self.source = None
             self.data = None
+            self.channel_loader = None
+            self.prefetcher = None
+
+            
+    def fork_traces(self):
+        """Stop sharing the buffers of the derived traces with other tabs.
+        """
+        for trace in self.traces[1:]:
+            trace.fork()
+
+            
+    def memory(self):
+        """Memory used by the buffers.
+
+        Returns
+        -------
+        memory: dict
+            For each derived trace the number of bytes used by its
+            buffer. The raw data are accounted for by the shared
+            `source`, buffers shared with other tabs by the tab whose
+            trace computes them.
+        """
+        memory = {}
+        if self.data is None:
+            return memory
+        for trace in self.traces[1:]:
+            if trace.owner is None:
+                memory[trace.name] = trace.buffer.nbytes
+        return memory
+
+
+    def release(self):
+        """Free all buffers.
+
+        The buffers are restored by `update_times()` after
+        `activate()`. The shared raw data and buffers shared with
+        other tabs are freed as soon as all tabs using them have been
+        released.
+
+        Returns
+        -------
+        nbytes: int
+            Number of bytes that have been freed.
+        """
+        if self.data is None or self.released:
+            return 0
+        nbytes = sum(self.memory().values())
+        self.recomputer.cancel()
+        in_use = not all(user.released for user in self.source.users
+                         if user is not self)
+        for trace in self.traces[1:]:
+            if in_use and (trace.owner is not None or len(trace.sharers) > 0):
+                # still displayed by another tab:
+                if trace.owner is None:
+                    nbytes -= trace.buffer.nbytes
+                continue
+            trace.release()
+        self.released = True
+        nbytes += self.source.release()
+        return nbytes
+
+
+    def release_hidden(self):
+        """Free the buffers of derived traces that are not displayed.
+
+        Only traces that are not needed by any displayed trace and
+        that do not share their buffer with other tabs are freed.
+        Their buffers are restored by `update_times()` as soon as
+        they are displayed again.
+
+        Returns
+        -------
+        nbytes: int
+            Number of bytes that have been freed.
+        """
+        if self.data is None or self.released:
+            return 0
+        traces = [t for t in self.traces[1:] if not t.need_update and
+                  t.owner is None and len(t.sharers) == 0 and
+                  len(t.buffer) > 0]
+        if len(traces) == 0:
+            return 0
+        # buffers must not be freed while they are recomputed:
+        self.recomputer.cancel()
+        nbytes = 0
+        for trace in traces:
+            nbytes += trace.buffer.nbytes
+            trace.release()
+        self.recomputer.start()
+        return nbytes
+
+
+    def activate(self):
+        """Mark the data as being displayed.
+
+        Released buffers are restored by the next call of
+        `update_times()`.
+        """
+        self.released = False
+        if self.data is not None:
+            memory_budget.touch(self)
+
+            
+    def set_channels(self, channels=None):
+        """Load raw data and compute derived traces only for some channels.
+
+        Raw data of newly shown channels are loaded right away, the
+        buffers of derived traces are filled in by the next call of
+        `update_times()`.
+
+        Parameters
+        ----------
+        channels: None or list of int
+            Indices of the displayed channels. All if None.
+        """
+        self.recomputer.cancel()
+        self.show_channels = channels
+        if channels is not None:
+            channels = [c for c in channels if c < self.channels]
+        if self.source is not None:
+            # raw data of the channels shown in any tab:
+            self.source.set_channels()
+        for trace in self.traces[1:]:
+            if trace.source is not None:
+                trace.set_active(channels)
 
             
     def set_need_update(self):
@@ -222,13 +427,66 @@ class Data(object):
             d.set_need_update()
 
             
-    def update_times(self, t0, t1):
+    def buffers_move(self, t0, t1):
+        """Whether showing a time range moves any buffer.
+
+        Parameters
+        ----------
+        t0: float
+            Start of the time range the buffers need to cover.
+        t1: float
+            End of the time range the buffers need to cover.
+
+        Returns
+        -------
+        move: bool
+            True if the raw data or any derived trace need to be
+            moved or resized.
+        """
         if self.data.need_update:
-            self.data.update_time(t0 - self.tbefore,
-                                  t1 + self.tafter)
+            start = int((t0 - self.tbefore)*self.data.rate)
+            stop = int((t1 + self.tafter)*self.data.rate) + 1
+            offset, nframes = self.data._buffer_position(start, stop)
+            if offset != self.data.offset or \
+               nframes != len(self.data.buffer):
+                return True
         for trace in self.traces[1:]:
-            if trace.need_update:
-                trace.align_buffer()
+            if trace.need_update and \
+               trace.aligned_position() != (trace.offset, len(trace.buffer)):
+                return True
+        return False
+
+            
+    def update_times(self, t0, t1):
+        b0, b1 = t0, t1
+        if t1 - t0 > self.overview_time and self.data.compressed.complete:
+            # wider views are drawn from the compressed full data,
+            # buffers only need to cover the center of the view:
+            tc = (t0 + t1)/2
+            b0 = tc - self.overview_time/2
+            b1 = tc + self.overview_time/2
+        # released buffers are restored when displayed again:
+        if not self.released:
+            if len(self.source.users) > 1:
+                self.source.share_traces(self)
+            # buffers must not be moved while they are recomputed,
+            # also not by other tabs sharing the raw data:
+            if self.buffers_move(b0, b1):
+                self.source.cancel()
+            if self.data.need_update:
+                self.data.update_time(b0 - self.tbefore,
+                                      b1 + self.tafter)
+                # read ahead in scroll direction:
+                self.prefetcher.update(int(b0*self.data.rate))
+            fill = not self.recomputer.enabled
+            for trace in self.traces[1:]:
+                if trace.need_update:
+                    trace.align_buffer(fill)
+                    if not trace.is_valid():
+                        # invalid frames are processed in the background:
+                        self.recomputer.add(trace)
+            self.recomputer.start()
+            memory_budget.enforce()
         i0 = int(t0*self.data.rate)
         if i0 >= self.data.frames:
             i0 = self.data.frames - 1
@@ -129,12 +129,17 @@ class DataBrowser(QWidget):
         self.show_powers = False
         self.show_cbars = False
         self.show_fulldata = True
+        self.show_fullspec = False
         
         # auto scroll:
         self.scroll_step = 0.0
         self.scroll_timer = QTimer(self)
         self.scroll_timer.timeout.connect(self.scroll_further)
 
+        # redraw while derived traces are recomputed:
+        self.recompute_timer = QTimer(self)
+        self.recompute_timer.timeout.connect(self.update_recomputed)
+
         # audio:
         self.audio = audio
         self.audio_timer = QTimer(self)
@@ -313,6 +318,7 @@ class DataBrowser(QWidget):
         
         self.current_channel = self.show_channels[0]
         self.selected_channels = list(range(self.data.channels))
+        self.data.set_channels(self.show_channels)
 
         # load marker data:
         locs, labels = self.data.data.markers()
@@ -654,7 +660,7 @@ class DataBrowser(QWidget):
                     if idx1 >= len(self.data.data):
                         idx1 = len(self.data.data) - 1
                     if idx1 >= 0:
-                        tl[lidx].addPoints((t1,), (self.data.data[idx1, c],), data=(ds,), tip=marker_tip)
+                        tl[lidx].addPoints((t1,), (self.data.read_frames(idx1, idx1 + 1, [c])[0, 0],), data=(ds,), tip=marker_tip)
             for c, sl in enumerate(self.spec_labels):
                 if ddt > 0:
                     # TODO: self.spec_region_labels
@@ -796,7 +802,7 @@ class DataBrowser(QWidget):
                 else:
                     tidx = int(self.marker_time*self.data.rate)
                     tl[lidx].addPoints((self.marker_time,),
-                                       (self.data.data[tidx, c],),
+                                       (self.data.read_frames(tidx, tidx + 1, [c])[0, 0],),
                                        tip=marker_tip)
             for c, sl in enumerate(self.spec_labels):
                 y = 0.0 if self.marker_freq is None else self.marker_freq
@@ -979,10 +985,25 @@ class DataBrowser(QWidget):
         self.setting = True
         self.plot_ranges.set_ranges()
         self.data.set_need_update()
-        self.panels.update_plots()
+        if self.data.data is not None:
+            # restore buffers released while in the background:
+            self.data.activate()
+            trange = self.plot_ranges[Panel.times[0]]
+            self.data.update_times(trange.r0[0], trange.r1[0])
+        self.update_plots()
         self.plot_ranges.set_powers()
+        self.watch_recompute()
         self.setting = False
 
+
+    def update_plots(self):
+        """Redraw the plots of a displayed browser.
+
+        Hidden browsers are redrawn by `showEvent()`.
+        """
+        if self.isVisible():
+            self.panels.update_plots()
+
                 
     def resizeEvent(self, event):
         if self.show_channels is None or len(self.show_channels) == 0:
@@ -1019,6 +1040,8 @@ class DataBrowser(QWidget):
         if not self.show_fulldata:
             data_height = 0
         height -= len(self.show_channels)*data_height
+        if self.show_fullspec:
+            height -= 2*data_height
         # subtract toolbar:
         height -= 2*xheight
         # subtract time axis:
@@ -1082,7 +1105,8 @@ class DataBrowser(QWidget):
                     self.figs[c].ci.layout.setRowFixedHeight(panel.row, 0)
         # fix full data plot:
         if self.datafig is not None:
-            self.datafig.update_layout(self.show_channels, data_height)
+            self.datafig.update_layout(self.show_channels, data_height,
+                                       self.show_fullspec)
             self.datafig.setVisible(self.show_fulldata)
         # update:
         for c in self.show_channels:
@@ -1131,8 +1155,9 @@ class DataBrowser(QWidget):
         trange.set_ranges(toffset, None, twindow, None, True)
         fn = self.data.update_times(trange.r0[0], trange.r1[0])
         self.sigFilenameChanged.emit(self, fn)
-        self.panels.update_plots()
+        self.update_plots()
         self.plot_ranges.set_powers()
+        self.watch_recompute()
         self.setting = False
         
 
@@ -1144,8 +1169,9 @@ class DataBrowser(QWidget):
         fn = self.data.update_times(trange.r0[0], trange.r1[0])
         self.sigFilenameChanged.emit(self, fn)
         # TODO: set time range here!
-        self.panels.update_plots()
+        self.update_plots()
         self.plot_ranges.set_powers()
+        self.watch_recompute()
         self.setting = False
         
 
@@ -1193,8 +1219,9 @@ class DataBrowser(QWidget):
             return
         spectrogram = self.data[self.spectrogram]
         spectrogram.update(nfft, overlap_frac)
-        self.panels.update_plots()
+        self.update_plots()
         self.plot_ranges.set_powers()
+        self.watch_recompute()
         self.nfftw.setCurrentText(f'{spectrogram.nfft}')
         T = spectrogram.nfft/self.data.rate
         if T >= 1:
@@ -1282,8 +1309,9 @@ class DataBrowser(QWidget):
         self.hpfw.setValue(filtered.highpass_cutoff)
         self.lpfw.setValue(filtered.lowpass_cutoff)
         filtered.update()
-        self.panels.update_plots()
+        self.update_plots()
         self.plot_ranges.set_powers()
+        self.watch_recompute()
         self.setting = False
         self.sigFilterChanged.emit()  # dispatch
 
@@ -1302,7 +1330,8 @@ class DataBrowser(QWidget):
             envelope.envelope_cutoff = envelope_cutoff
             envelope.update()
             self.data.set_need_update()
-            self.panels.update_plots()
+            self.update_plots()
+            self.watch_recompute()
             self.envfw.setValue(envelope.envelope_cutoff)
         if show_envelope is not None:
             for name in self.data.keys():
@@ -1457,6 +1486,12 @@ class DataBrowser(QWidget):
             self.acts.channels[c].setChecked(c in self.show_channels)
         self.adjust_layout(self.width(), self.height())
         self.update_borders()
+        # compute derived traces of newly shown channels:
+        self.data.set_channels(self.show_channels)
+        trange = self.plot_ranges[Panel.times[0]]
+        self.data.update_times(trange.r0[0], trange.r1[0])
+        self.update_plots()
+        self.watch_recompute()
         self.setting = False
             
         
@@ -1541,10 +1576,31 @@ class DataBrowser(QWidget):
         trange = self.plot_ranges[Panel.times[0]]
         fn = self.data.update_times(trange.r0[0], trange.r1[0])
         self.sigFilenameChanged.emit(self, fn)
-        self.panels.update_plots()
+        self.update_plots()
         self.plot_ranges.set_powers()
+        self.watch_recompute()
             
 
+    def watch_recompute(self):
+        """Redraw plots until the derived traces are recomputed.
+        """
+        if self.data.recomputer.is_busy() and \
+           not self.recompute_timer.isActive():
+            self.recompute_timer.start(200)
+
+
+    def update_recomputed(self):
+        if self.setting:
+            return
+        self.setting = True
+        busy = self.data.recomputer.is_busy()
+        self.update_plots()
+        if not busy:
+            self.recompute_timer.stop()
+            self.plot_ranges.set_powers()
+        self.setting = False
+
+            
     def toggle_traces(self):
         self.show_traces = not self.show_traces
         if not self.show_traces:
@@ -1576,6 +1632,13 @@ class DataBrowser(QWidget):
         self.set_panels()
             
             
+    def toggle_fullspec(self):
+        self.show_fullspec = not self.show_fullspec
+        if self.show_fullspec:
+            self.show_fulldata = True
+        self.set_panels()
+            
+            
     def toggle_grids(self):
         self.grids -= 1
         if self.grids < 0:
@@ -1762,7 +1825,14 @@ class DataBrowser(QWidget):
             t0 = 0
         if t1 > self.data.data.frames/self.data.data.rate:
             t1 = self.data.data.frames/self.data.data.rate
-        traces = self.data.get_region(t0, t1, channel)
+        # only the traces the analyzers need:
+        names = set()
+        for a in self.analyzers:
+            if a.trace_names is None:
+                names = None
+                break
+            names.update(a.trace_names)
+        traces = self.data.get_region(t0, t1, channel, names)
         for a in self.analyzers:
             a.analyze(t0, t1, channel, traces)
         QApplication.restoreOverrideCursor()
@@ -1911,7 +1981,7 @@ class DataBrowser(QWidget):
             rel_path = os.fspath(rel_path)
             try:
                 write_data(file_path,
-                           self.data.data[i0:i1, self.selected_channels],
+                           self.data.read_frames(i0, i1, self.selected_channels),
                            self.data.rate, self.data.data.ampl_max,
                            self.data.data.unit, md, locs, labels,
                            encoding=self.data.data.encoding)
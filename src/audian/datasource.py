@@ -0,0 +1,370 @@
+"""DataSource
+
+Share the raw data between all tabs that show the same recording.
+
+All `Data` that open the same files with the same loader settings
+share a single `DataSource`. It holds the only loader of the raw data
+with its buffer, the `ChannelLoader`, the `Prefetcher`, and the
+`CompressedData` with the full traces. The raw data are thus decoded,
+read ahead, and compressed only once. Each `Data` accesses the shared
+raw data via its own `DataView` that holds the plot items and the
+derived traces of its tab. Whenever the shared buffer is moved or
+loaded, the `buffer_changed` flags of all views are set.
+
+Derived traces of different tabs with the same class, name, settings,
+and shared source share their buffer as well (`share_traces()`). A
+trace gets its own buffer again as soon as its tab changes its
+settings (`BufferedData.fork()`).
+
+The buffer of the raw data holds the channels displayed in any of the
+tabs. Moving the buffer cancels the recomputations of all tabs. The
+data source is closed as soon as the last of its tabs is closed.
+"""
+
+import numpy as np
+
+from pathlib import Path
+from thunderlab.dataloader import DataLoader
+
+from .channelloader import ChannelLoader
+from .compresseddata import CompressedData
+from .prefetcher import Prefetcher
+
+
+sources = {}
+"""All open data sources by their keys."""
+
+
+def source_key(file_path, tbuffer, tback, load_kwargs, unwrap, unwrap_clip):
+    """Key identifying the data source of some data.
+
+    Parameters
+    ----------
+    file_path: str or Path or list of str or Path
+        Path(s) of the data file(s).
+    tbuffer: float
+        Size of the buffer in seconds.
+    tback: float
+        Part of the buffer kept before the requested data in seconds.
+    load_kwargs: dict
+        Key-word arguments for the data loader.
+    unwrap: float
+        Threshold for unwrapping clipped data.
+    unwrap_clip: bool
+        Whether unwrapped data are clipped.
+
+    Returns
+    -------
+    key: tuple
+        Data opened with equal keys share their data source.
+    """
+    if isinstance(file_path, (list, tuple, np.ndarray)):
+        paths = tuple(str(Path(fp).resolve()) for fp in file_path)
+    else:
+        paths = (str(Path(file_path).resolve()),)
+    kwargs = tuple(sorted((k, repr(v)) for k, v in load_kwargs.items()))
+    return paths, tbuffer, tback, kwargs, unwrap, unwrap_clip
+
+
+def open_source(user, file_path, tbuffer, tback, load_kwargs,
+                unwrap, unwrap_clip):
+    """Open a data source or share an already opened one.
+
+    Parameters
+    ----------
+    user: Data
+        The data that use the source.
+    file_path: str or Path or list of str or Path
+        Path(s) of the data file(s).
+    tbuffer: float
+        Size of the buffer in seconds.
+    tback: float
+        Part of the buffer kept before the requested data in seconds.
+    load_kwargs: dict
+        Key-word arguments for the data loader.
+    unwrap: float
+        Threshold for unwrapping clipped data.
+    unwrap_clip: bool
+        Whether unwrapped data are clipped.
+
+    Returns
+    -------
+    source: DataSource
+        The data source with `user` registered as one of its users.
+    """
+    key = source_key(file_path, tbuffer, tback, load_kwargs,
+                     unwrap, unwrap_clip)
+    if key not in sources:
+        sources[key] = DataSource(key, file_path, tbuffer, tback,
+                                  load_kwargs, unwrap, unwrap_clip)
+    source = sources[key]
+    source.users.append(user)
+    return source
+
+
+def buffer_owner(trace):
+    """The object holding the buffer of a trace.
+
+    Parameters
+    ----------
+    trace: DataView or BufferedData
+        The raw data of a tab or a derived trace.
+
+    Returns
+    -------
+    owner: DataLoader or BufferedData
+        The shared loader of the raw data or the trace computing the
+        buffer of a derived trace.
+    """
+    if isinstance(trace, DataView):
+        return trace.loader
+    return trace if trace.owner is None else trace.owner
+
+
+def trace_key(trace):
+    """Key identifying derived traces that compute the same buffer.
+
+    Parameters
+    ----------
+    trace: BufferedData
+        A derived trace.
+
+    Returns
+    -------
+    key: tuple or None
+        Traces with equal keys can share their buffer. None if the
+        trace does not list its `settings`.
+    """
+    if trace.settings is None:
+        return None
+    return (type(trace), trace.name, buffer_owner(trace.source),
+            tuple(getattr(trace, name) for name in trace.settings))
+
+
+class DataSource:
+
+    def __init__(self, key, file_path, tbuffer, tback, load_kwargs,
+                 unwrap, unwrap_clip):
+        """Open the raw data.
+
+        Use `open_source()` for sharing data sources.
+
+        Parameters
+        ----------
+        key: tuple
+            Key of the data source as returned by `source_key()`.
+        file_path: str or Path or list of str or Path
+            Path(s) of the data file(s).
+        tbuffer: float
+            Size of the buffer in seconds.
+        tback: float
+            Part of the buffer kept before the requested data in seconds.
+        load_kwargs: dict
+            Key-word arguments for the data loader.
+        unwrap: float
+            Threshold for unwrapping clipped data.
+        unwrap_clip: bool
+            Whether unwrapped data are clipped.
+        """
+        self.key = key
+        self.users = []
+        verbose = isinstance(file_path, (list, tuple, np.ndarray))
+        self.data = DataLoader(file_path, tbuffer, tback,
+                               verbose=verbose, **load_kwargs)
+        self.data.set_unwrap(unwrap, unwrap_clip, False, self.data.unit)
+        self.data.compressed = CompressedData(self.data)
+        self.channel_loader = ChannelLoader(self.data)
+        self.prefetcher = Prefetcher(self.data, load_kwargs)
+        self.load_file = self.data.load_buffer
+        self.data.load_buffer = self.load_buffer
+        self.recycle_buffer = self.data._recycle_buffer
+        self.data._recycle_buffer = self._recycle_buffer
+
+
+    def remove(self, user):
+        """Remove a user and close the source if it was the last one.
+
+        Parameters
+        ----------
+        user: Data
+            The data that do not use the source anymore.
+        """
+        if user in self.users:
+            self.users.remove(user)
+        if len(self.users) > 0:
+            self.set_channels()
+            return
+        sources.pop(self.key, None)
+        self.prefetcher.close()
+        self.data.compressed.close()
+        self.data.close()
+
+
+    def load_buffer(self, offset, nframes, buffer):
+        """Load data into the buffer and mark it changed in all views.
+
+        Replaces the `load_buffer()` function of the raw data.
+        """
+        self.load_file(offset, nframes, buffer)
+        self.set_changed()
+
+
+    def _recycle_buffer(self, offset, nframes):
+        """Move the buffer and mark it changed in all views.
+
+        Replaces the `_recycle_buffer()` function of the raw data.
+        """
+        r_offset, r_nframes = self.recycle_buffer(offset, nframes)
+        self.set_changed()
+        return r_offset, r_nframes
+
+
+    def set_changed(self, channels=None):
+        """Mark channels of the buffer as changed in the views of all users.
+
+        Parameters
+        ----------
+        channels: None, or list or mask of channels
+            The changed channels. All if None.
+        """
+        if channels is None:
+            channels = slice(None)
+        for user in self.users:
+            if user.data is not None:
+                user.data.buffer_changed[channels] = True
+
+
+    def share_traces(self, user):
+        """Share derived traces of a user with equal ones of other users.
+
+        Traces that compute a buffer for other users already are not
+        moved to another buffer.
+
+        Parameters
+        ----------
+        user: Data
+            The data whose derived traces join the ones of the other
+            users.
+        """
+        owners = [t for u in self.users if u is not user and
+                  u.data is not None for t in u.traces[1:]
+                  if t.owner is None and t.source is not None]
+        if len(owners) == 0:
+            return
+        for trace in user.traces[1:]:
+            if trace.owner is not None or len(trace.sharers) > 0:
+                continue
+            key = trace_key(trace)
+            if key is None:
+                continue
+            for owner in owners:
+                if trace_key(owner) == key:
+                    trace.share(owner)
+                    break
+
+
+    def cancel(self):
+        """Cancel recomputations of all users before moving the buffer.
+        """
+        for user in self.users:
+            user.recomputer.cancel()
+
+
+    def start(self):
+        """Restart recomputations of all users after `cancel()`.
+        """
+        for user in self.users:
+            user.recomputer.start()
+
+
+    def set_channels(self):
+        """Load the channels displayed by any of the users.
+        """
+        channels = set()
+        for user in self.users:
+            if user.show_channels is None:
+                channels = None
+                break
+            channels.update(c for c in user.show_channels
+                            if c < self.data.channels)
+        if channels is not None:
+            channels = sorted(channels)
+        self.cancel()
+        loaded = np.array(self.channel_loader.loaded)
+        self.channel_loader.set_active(channels)
+        self.set_changed(self.channel_loader.loaded & ~loaded)
+        self.prefetcher.set_channels(self.channel_loader.active)
+
+
+    def memory(self):
+        """Memory used by the buffers.
+
+        Returns
+        -------
+        memory: dict
+            Number of bytes used by the raw data, counting loaded
+            channels only, and by the read-ahead data ('prefetch').
+        """
+        memory = {}
+        buffer = self.data.buffer
+        memory['data'] = len(buffer)*buffer.itemsize*\
+            np.sum(self.channel_loader.loaded)
+        buffer = self.prefetcher.buffer
+        memory['prefetch'] = len(buffer)*buffer.itemsize*\
+            np.sum(self.prefetcher.active)
+        return memory
+
+
+    def release(self):
+        """Free the buffers if all users have been released.
+
+        Returns
+        -------
+        nbytes: int
+            Number of bytes that have been freed.
+        """
+        if not all(user.released for user in self.users):
+            return 0
+        nbytes = sum(self.memory().values())
+        self.cancel()
+        self.prefetcher.close()
+        self.data.buffer = np.zeros((0, self.data.channels),
+                                    self.data.buffer.dtype)
+        self.data.offset = 0
+        self.set_changed()
+        return nbytes
+
+
+class DataView:
+
+    def __init__(self, loader):
+        """View of a tab on the shared raw data.
+
+        Attributes and methods of the shared loader are accessible
+        via the view. Attributes assigned to the view, like the
+        plot items, the derived traces, and the `need_update` flag,
+        belong to the view. Each view has its own `buffer_changed`
+        flags that are set by the `DataSource` and cleared by the
+        plots of its tab.
+
+        Parameters
+        ----------
+        loader: DataLoader
+            The shared raw data.
+        """
+        self.loader = loader
+        self.buffer_changed = np.ones(loader.channels, dtype=bool)
+
+
+    def __getattr__(self, name):
+        if name == 'loader':
+            raise AttributeError(name)
+        return getattr(self.loader, name)
+
+
+    def __len__(self):
+        return len(self.loader)
+
+
+    def __getitem__(self, key):
+        return self.loader[key]
@@ -10,8 +10,8 @@ from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtWidgets import QGraphicsSimpleTextItem, QLabel
 from PyQt5.QtWidgets import QApplication
 from PyQt5.QtGui import QPalette
+from thunderlab.powerspectrum import decibel
 
-from .compresseddata import CompressedData
 
 
 def secs_to_str(time, msec_level=10, precision=10):
@@ -133,13 +133,43 @@ class FullTracePlot(pg.GraphicsLayoutWidget):
             self.addItem(axt, row=c, col=0)
             self.axs.append(axt)
 
+        # coarse spectrogram of the first shown channel:
+        axs = pg.PlotItem()
+        axs.showAxes(True, False)
+        axs.getAxis('left').setWidth(left_margin)
+        axs.getViewBox().setBackgroundColor(None)
+        axs.getViewBox().setDefaultPadding(padding=0)
+        axs.hideButtons()
+        axs.setMenuEnabled(False)
+        axs.setMouseEnabled(False, False)
+        axs.enableAutoRange(False, False)
+        axs.setLimits(xMin=0, xMax=self.tmax,
+                      minXRange=self.tmax, maxXRange=self.tmax)
+        axs.setXRange(0, self.tmax)
+        self.spec_item = pg.ImageItem()
+        self.spec_item.setOpts(axisOrder='row-major')
+        self.spec_item.setLookupTable(pg.colormap.get('CET-R4').getLookupTable())
+        axs.addItem(self.spec_item)
+        axs.setVisible(False)
+        self.addItem(axs, row=self.data.channels, col=0)
+        self.spec_ax = axs
+        self.spec_channel = -1
+        self.spec_height = 0
+        self.spec = None
+        self.spec_drawn = None
+        self.spec_max = None
+
         self.time_info = QLabel(self)
         self.time_info.setWindowFlags(self.windowFlags()
                                       | Qt.BypassWindowManagerHint
                                       | Qt.FramelessWindowHint)
         self.time_info.setVisible(False)
         
-        self.compressed_data = CompressedData(self.data.data)
+        self.compressed_data = self.data.data.compressed
+        self.plot_level = -1
+        self.plot_times = None
+        self.plot_datas = None
+        self.plot_drawn = None
             
 
     def __del__(self):
@@ -147,7 +177,9 @@ class FullTracePlot(pg.GraphicsLayoutWidget):
 
         
     def close(self):
-        self.compressed_data.close()
+        # compressed data are closed by the data source shared by all
+        # tabs showing the same data:
+        pass
 
         
     def polish(self):
@@ -158,39 +190,98 @@ class FullTracePlot(pg.GraphicsLayoutWidget):
 
 
     def prepare(self):
+        if self.compressed_data.datas is not None:
+            # already prepared by another tab showing the same data:
+            return
         self.compressed_data.load_data()
-        max_pixel = QApplication.desktop().screenGeometry().width()
-        self.compressed_data.start(max_pixel, self.data.load_kwargs)
+        self.compressed_data.start(self.data.load_kwargs)
             
 
     def plot_data(self):
 
-        def set_plot_ranges():
-            for c in range(self.compressed_data.datas.shape[1]):
-                ymin = np.min(self.compressed_data.datas[:, c])
-                ymax = np.max(self.compressed_data.datas[:, c])
+        def set_plot_ranges(datas):
+            for c in range(datas.shape[1]):
+                ymin = np.min(datas[:, c])
+                ymax = np.max(datas[:, c])
                 y = max(abs(ymin), abs(ymax))
                 self.axs[c].setYRange(-y, y)
                 self.axs[c].setLimits(yMin=-y, yMax=y,
                                       minYRange=2*y, maxYRange=2*y)
 
+        # coarsest level with at least one segment per pixel:
+        max_pixel = QApplication.desktop().screenGeometry().width()
+        step = self.data.data.frames//max_pixel
+        level = max(0, self.compressed_data.level(step))
         if not self.compressed_data.is_busy():
-            for c in range(self.compressed_data.datas.shape[1]):
-                self.lines[c].setData(self.compressed_data.times,
-                                      self.compressed_data.datas[:, c])
-            set_plot_ranges()
-            self.compressed_data.save_data()
+            times, datas = self.compressed_data.level_data(level)
+            for c in range(datas.shape[1]):
+                self.lines[c].setData(times, datas[:, c])
+            set_plot_ranges(datas)
+            for label in self.labels:
+                label.setText(secs_to_str(self.tmax, 1, 2))
+                label.setToolTip('Total duration of the recording')
         else:
-            lock = self.compressed_data.get_lock()
-            if lock.acquire(block=False):
-                for c in range(self.compressed_data.datas.shape[1]):
-                    self.lines[c].setData(self.compressed_data.times,
-                                          self.compressed_data.datas[:, c])
-                lock.release()
+            progress = self.compressed_data.progress()
+            for label in self.labels:
+                label.setText(f'{100*progress:.0f}%')
+                label.setToolTip('Progress of computing the full traces')
+            # coarser levels are computed at the end:
+            level = min(level, self.compressed_data.block_levels - 1)
+            if level != self.plot_level:
+                self.plot_level = level
+                self.plot_times, datas = \
+                    self.compressed_data.level_data(level)
+                self.plot_datas = np.zeros(datas.shape)
+                nblocks = len(self.compressed_data.done)
+                self.plot_drawn = np.zeros(nblocks, dtype=bool)
+            if self.compressed_data.update_level_data(level,
+                                                      self.plot_datas,
+                                                      self.plot_drawn):
+                for c in range(self.plot_datas.shape[1]):
+                    self.lines[c].setData(self.plot_times,
+                                          self.plot_datas[:, c])
             QTimer.singleShot(500, self.plot_data)
+        self.plot_spec()
+
+
+    def plot_spec(self):
+        """Draw the coarse spectrogram of the first shown channel.
+
+        Only segments of newly completed blocks are converted to
+        decibel.
+        """
+        if not self.spec_ax.isVisible() or self.spec_channel < 0:
+            return
+        times, freqs, power = \
+            self.compressed_data.spec_data(self.spec_channel)
+        if power is None:
+            return
+        if self.spec is None or self.spec.shape != power.T.shape:
+            self.spec = np.full(power.T.shape, np.nan)
+            nblock = self.compressed_data.nblock
+            nblocks = (self.data.data.frames + nblock - 1)//nblock
+            self.spec_drawn = np.zeros(nblocks, dtype=bool)
+            self.spec_max = None
+        segments = self.compressed_data.update_spec_segments(self.spec_drawn)
+        if len(segments) == 0:
+            return
+        for j0, j1 in segments:
+            spec = decibel(power[j0:j1].T)
+            spec[~np.isfinite(spec)] = np.nan
+            self.spec[:, j0:j1] = spec
+            if np.any(np.isfinite(spec)):
+                zmax = np.nanmax(spec)
+                if self.spec_max is None or zmax > self.spec_max:
+                    self.spec_max = zmax
+        zmax = 0 if self.spec_max is None else self.spec_max
+        self.spec_item.setImage(self.spec, levels=(zmax - 80, zmax))
+        dt = self.compressed_data.spec_step/self.data.rate
+        fres = self.data.rate/self.compressed_data.spec_nfft
+        self.spec_item.setRect(0, 0, len(times)*dt, freqs[-1] + fres)
+        self.spec_ax.setYRange(0, freqs[-1])
 
                     
-    def update_layout(self, channels, data_height):
+    def update_layout(self, channels, data_height, show_spec=False):
         first = True
         for c in range(self.data.channels):
             self.axs[c].setVisible(c in channels)
@@ -201,7 +292,18 @@ class FullTracePlot(pg.GraphicsLayoutWidget):
             else:
                 self.ci.layout.setRowFixedHeight(c, 0)
                 self.labels[c].setVisible(False)
-        self.setFixedHeight(len(channels)*data_height)
+        # coarse spectrogram:
+        show_spec = show_spec and len(channels) > 0 and \
+            self.compressed_data.spec_step > 0
+        self.spec_height = 2*data_height if show_spec else 0
+        self.ci.layout.setRowFixedHeight(self.data.channels, self.spec_height)
+        self.spec_ax.setVisible(show_spec)
+        channel = channels[0] if show_spec else -1
+        if channel != self.spec_channel:
+            self.spec_channel = channel
+            self.spec = None
+            self.plot_spec()
+        self.setFixedHeight(len(channels)*data_height + self.spec_height)
         self.data_height = data_height
 
 
@@ -0,0 +1,116 @@
+"""MemoryBudget
+
+Limit the memory used by the buffers of all opened data.
+
+All `Data` instances of the process register with the module-level
+`memory_budget`. The displayed data are the most recently activated
+ones. Whenever buffers have been updated, the buffers of the least
+recently displayed data are released until the total memory of all
+buffers fits into `max_bytes`. If this is not sufficient, the buffers
+of the hidden traces of the displayed data are released as well.
+Released buffers are restored as soon as their data or traces are
+displayed again. Raw data shared by several data are counted once and
+are only released together with the last of their data.
+
+The raw data and the buffers of the displayed traces of the displayed
+data, and buffers shared with other tabs, are never released. If they
+alone need more memory, the total memory exceeds `max_bytes`.
+"""
+
+
+class MemoryBudget:
+
+    max_bytes = 4e9
+
+    def __init__(self):
+        self.datas = []
+
+
+    def touch(self, data):
+        """Mark data as the most recently displayed ones.
+
+        Parameters
+        ----------
+        data: Data
+            The data that are displayed.
+        """
+        self.remove(data)
+        self.datas.append(data)
+
+
+    def remove(self, data):
+        """Forget about data that have been closed.
+
+        Parameters
+        ----------
+        data: Data
+            The closed data.
+        """
+        if data in self.datas:
+            self.datas.remove(data)
+
+
+    def sources(self):
+        """Data sources of all data, most recently displayed first.
+        """
+        sources = []
+        for data in reversed(self.datas):
+            if data.source is not None and data.source not in sources:
+                sources.append(data.source)
+        return sources
+
+
+    def total(self):
+        """Memory used by the buffers of all data in bytes.
+        """
+        total = sum(sum(d.memory().values()) for d in self.datas)
+        total += sum(sum(s.memory().values()) for s in self.sources())
+        return total
+
+
+    def enforce(self):
+        """Release buffers of the least recently displayed data.
+
+        Stops as soon as the total memory fits into the budget.
+        Finally, the buffers of the hidden traces of the displayed
+        data are released.
+        """
+        if self.max_bytes <= 0:
+            return
+        total = self.total()
+        for data in self.datas[:-1]:
+            if total <= self.max_bytes:
+                break
+            if not data.released:
+                total -= data.release()
+        if total > self.max_bytes and len(self.datas) > 0:
+            total -= self.datas[-1].release_hidden()
+
+
+    def report(self):
+        """Memory used per data and per trace.
+
+        Returns
+        -------
+        report: str
+            One line per data source and data and for each of their
+            buffers, most recently displayed ones first.
+        """
+        lines = []
+        for source in self.sources():
+            memory = source.memory()
+            users = len(source.users)
+            lines.append(f'{source.data.filepath}: {sum(memory.values())/1e6:.1f}MB raw data of {users} tab{"s" if users > 1 else ""}')
+            for name, nbytes in memory.items():
+                lines.append(f'  {name:<16s} {nbytes/1e6:8.1f}MB')
+        for data in reversed(self.datas):
+            memory = data.memory()
+            state = ' (released)' if data.released else ''
+            lines.append(f'{data.file_path}: {sum(memory.values())/1e6:.1f}MB{state}')
+            for name, nbytes in memory.items():
+                lines.append(f'  {name:<16s} {nbytes/1e6:8.1f}MB')
+        lines.append(f'total: {self.total()/1e6:.1f}MB of {self.max_bytes/1e6:.0f}MB')
+        return '\n'.join(lines)
+
+
+memory_budget = MemoryBudget()
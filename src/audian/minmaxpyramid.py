@@ -0,0 +1,214 @@
+"""Multi-resolution minima and maxima of buffered data.
+
+- class `MinMaxPyramid`: hierarchy of minima and maxima for fast plotting.
+"""
+
+import numpy as np
+
+
+class MinMaxPyramid(object):
+    """Hierarchy of minima and maxima for fast plotting.
+
+    Plotting a trace that has many more frames than pixels only needs
+    the minimum and maximum of the data within each pixel. Instead of
+    reducing all the frames of the visible time window on every redraw,
+    the `MinMaxPyramid` keeps minima and maxima of the buffer of a
+    trace at several levels of resolution. Level `k` holds minima and
+    maxima of segments of `min_step*base**k` frames, aligned to
+    multiples of this step counted from the first frame of the
+    data. Each level is computed in blocks from the next finer level,
+    and only when it is requested for the first time. The costs of a
+    redraw thus depend on the number of pixels and not on the length
+    of the time window.
+
+    Call `clear()` whenever the buffer of the trace changed.
+
+    Parameters
+    ----------
+    data: BufferedArray
+        The trace from whose buffer minima and maxima are computed.
+    channel: int
+        The channel of the trace.
+    base: int
+        Factor between the steps of successive levels.
+    min_step: int
+        Step of the finest level. For smaller steps, minima and
+        maxima are computed directly from the buffer.
+    block: int
+        Number of segments of a level that are computed in one go.
+
+    Attributes
+    ----------
+    offset: int
+        First frame of the buffer the levels have been set up for.
+    nframes: int
+        Number of frames of the buffer the levels have been set up for.
+    levels: list of dict
+        For each level its `step`, index of the `first` complete
+        segment in the buffer, minima `mins` and maxima `maxs`, and
+        `valid` flags for each block of segments.
+
+    Methods
+    -------
+    - `clear()`: Invalidate all levels.
+    - `level()`: Index of the coarsest level that resolves a given step.
+    - `downsample()`: Minima and maxima of consecutive segments.
+    """
+
+    def __init__(self, data, channel, base=4, min_step=64, block=1024):
+        self.data = data
+        self.channel = channel
+        self.base = base
+        self.min_step = min_step
+        self.block = block
+        self.clear()
+
+
+    def clear(self):
+        """Invalidate all levels.
+        """
+        self.offset = 0
+        self.nframes = 0
+        self.levels = []
+
+
+    def _setup(self):
+        """Set up levels for the current buffer of the trace.
+        """
+        self.offset = self.data.offset
+        self.nframes = len(self.data.buffer)
+        self.levels = []
+        step = self.min_step
+        while 2*step <= self.nframes:
+            first = (self.offset + step - 1)//step
+            n = (self.offset + self.nframes)//step - first
+            nblocks = (n + self.block - 1)//self.block
+            self.levels.append(dict(step=step, first=first,
+                                    mins=np.empty(n, self.data.buffer.dtype),
+                                    maxs=np.empty(n, self.data.buffer.dtype),
+                                    valid=np.zeros(nblocks, dtype=bool)))
+            step *= self.base
+
+
+    def level(self, step):
+        """Index of the coarsest level that resolves a given step.
+
+        Parameters
+        ----------
+        step: int
+            Number of frames per pixel.
+
+        Returns
+        -------
+        level: int
+            Index into `levels`. -1 if no level is suitable
+            and data need to be reduced from the buffer directly.
+        """
+        if self.offset != self.data.offset or \
+           self.nframes != len(self.data.buffer):
+            self._setup()
+        k = -1
+        for i, level in enumerate(self.levels):
+            if level['step'] > step:
+                break
+            k = i
+        return k
+
+
+    def _ensure(self, k, i0, i1):
+        """Make sure segments `i0` to `i1` of level `k` are computed.
+        """
+        level = self.levels[k]
+        b0 = i0//self.block
+        b1 = (i1 + self.block - 1)//self.block
+        invalid = b0 + np.flatnonzero(~level['valid'][b0:b1])
+        if len(invalid) == 0:
+            return
+        # runs of successive invalid blocks:
+        breaks = np.flatnonzero(np.diff(invalid) > 1) + 1
+        for run in np.split(invalid, breaks):
+            j0 = run[0]*self.block
+            j1 = min((run[-1] + 1)*self.block, len(level['mins']))
+            step = level['step']
+            if k == 0:
+                # reduce from buffer:
+                s0 = (level['first'] + j0)*step - self.offset
+                s1 = (level['first'] + j1)*step - self.offset
+                buffer = self.data.buffer[s0:s1, self.channel]
+                segments = np.arange(0, s1 - s0, step)
+                np.minimum.reduceat(buffer, segments,
+                                    out=level['mins'][j0:j1])
+                np.maximum.reduceat(buffer, segments,
+                                    out=level['maxs'][j0:j1])
+            else:
+                # reduce from finer level:
+                lower = self.levels[k - 1]
+                l0 = (level['first'] + j0)*self.base - lower['first']
+                l1 = (level['first'] + j1)*self.base - lower['first']
+                self._ensure(k - 1, l0, l1)
+                np.min(lower['mins'][l0:l1].reshape(-1, self.base), axis=1,
+                       out=level['mins'][j0:j1])
+                np.max(lower['maxs'][l0:l1].reshape(-1, self.base), axis=1,
+                       out=level['maxs'][j0:j1])
+            level['valid'][run] = True
+
+
+    def downsample(self, start, stop, step):
+        """Minima and maxima of consecutive segments.
+
+        Segments are aligned to multiples of the returned step. Only
+        segments that are completely contained in the buffer are
+        returned.
+
+        Parameters
+        ----------
+        start: int
+            Index of first requested frame.
+        stop: int
+            Index of the frame after the last requested one.
+        step: int
+            Number of frames per segment.
+
+        Returns
+        -------
+        start: int
+            Index of the first frame of the first segment.
+        step: int
+            Number of frames per segment. A multiple of the
+            step of the level used for downsampling.
+        data: ndarray
+            Alternating minima and maxima of the segments.
+        """
+        k = self.level(step)
+        if k >= 0:
+            level = self.levels[k]
+            lstep = level['step']
+            n = step//lstep
+            step = n*lstep
+            first = level['first']
+            last = first + len(level['mins'])
+            j0 = max(start//step*n, (first + n - 1)//n*n) - first
+            j1 = min(stop//step*n + n, last//n*n) - first
+            if j1 <= j0:
+                return j0*lstep, step, np.zeros(0)
+            self._ensure(k, j0, j1)
+            segments = np.arange(0, j1 - j0, n)
+            data = np.empty(2*len(segments), level['mins'].dtype)
+            np.minimum.reduceat(level['mins'][j0:j1], segments,
+                                out=data[0::2])
+            np.maximum.reduceat(level['maxs'][j0:j1], segments,
+                                out=data[1::2])
+            return (first + j0)*lstep, step, data
+        # reduce from buffer:
+        offset = self.data.offset
+        start = max(start//step, (offset + step - 1)//step)*step
+        stop = min((stop//step + 1)*step,
+                   (offset + len(self.data.buffer))//step*step)
+        if stop <= start:
+            return start, step, np.zeros(0)
+        buffer = self.data.buffer[start - offset:stop - offset, self.channel]
+        segments = np.arange(0, stop - start, step)
+        data = np.empty(2*len(segments), buffer.dtype)
+        np.minimum.reduceat(buffer, segments, out=data[0::2])
+        np.maximum.reduceat(buffer, segments, out=data[1::2])
+        return start, step, data
@@ -0,0 +1,186 @@
+"""Prefetcher
+
+Read raw data ahead of the displayed time window in a background
+thread.
+
+The direction and speed of scrolling is estimated from the recent
+positions of the displayed window. The data beyond the edge of the
+buffer in scroll direction are read and decoded by a separate loader
+in a background thread. When the buffer is moved, the prefetched data
+are copied into the buffer and only the remaining frames are loaded
+from file. Only the active channels are read ahead.
+"""
+
+import threading
+import numpy as np
+
+from time import monotonic
+from thunderlab.dataloader import DataLoader
+
+from .channelloader import ChannelLoader
+
+
+class Prefetcher:
+
+    ahead_time = 2.0
+    history = 4
+    enabled = True
+
+    def __init__(self, data, load_kwargs):
+        """Read data ahead in a background thread.
+
+        Replaces the `load_buffer()` function of `data`.
+
+        Parameters
+        ----------
+        data: DataLoader
+            The raw data.
+        load_kwargs: dict
+            Key-word arguments for the data loader.
+        """
+        self.data = data
+        self.load_kwargs = load_kwargs
+        self.loader = None
+        self.channel_loader = None
+        self.thread = None
+        self.lock = threading.Lock()
+        self.offset = 0
+        self.buffer = np.zeros((0, self.data.channels))
+        self.pending = (0, 0)
+        self.active = np.ones(self.data.channels, dtype=bool)
+        self.positions = []
+        self.load_file = self.data.load_buffer
+        self.data.load_buffer = self.load_buffer
+
+    def __del__(self):
+        self.close()
+
+    def close(self):
+        self.wait()
+        self.buffer = np.zeros((0, self.data.channels))
+        if self.loader is not None:
+            self.loader.close()
+            self.loader = None
+
+    def wait(self):
+        """Wait for the running prefetch to finish.
+        """
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def set_channels(self, active):
+        """Set the channels that are read ahead.
+
+        Parameters
+        ----------
+        active: ndarray of bool
+            For each channel whether it is loaded.
+        """
+        self.wait()
+        if np.any(active & ~self.active):
+            # prefetched data lack newly active channels:
+            self.buffer = np.zeros((0, self.data.channels))
+        self.active = np.array(active)
+
+        
+    def is_busy(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def update(self, start):
+        """Start prefetching after the buffer has been updated.
+
+        Parameters
+        ----------
+        start: int
+            Index of the first frame of the displayed time window.
+        """
+        if not self.enabled or len(self.data.buffer) >= self.data.frames:
+            return
+        self.positions.append((monotonic(), start))
+        self.positions = self.positions[-self.history:]
+        if len(self.positions) < 2 or self.is_busy():
+            return
+        t0, start0 = self.positions[0]
+        t1, start1 = self.positions[-1]
+        if start1 == start0:
+            return
+        # frames read ahead follow the scroll speed:
+        nbuffer = len(self.data.buffer)
+        speed = abs(start1 - start0)/max(t1 - t0, 1e-3)
+        n = int(speed*self.ahead_time)
+        n = min(max(n, nbuffer//2), nbuffer)
+        if start1 > start0:
+            offset = self.data.offset + nbuffer
+        else:
+            offset = self.data.offset - n
+        if offset < 0:
+            n += offset
+            offset = 0
+        if offset + n > self.data.frames:
+            n = self.data.frames - offset
+        if n <= 0:
+            return
+        if offset >= self.offset and \
+           offset + n <= self.offset + len(self.buffer):
+            return
+        self.wait()
+        self.pending = (offset, n)
+        self.thread = threading.Thread(target=self.prefetch,
+                                       args=(offset, n), daemon=True)
+        self.thread.start()
+
+    def prefetch(self, offset, nframes):
+        """Read data in the background thread.
+
+        Uses its own data loader, since the one of the displayed data
+        is not thread safe.
+        """
+        if self.loader is None:
+            if len(self.data.file_paths) > 1:
+                self.loader = DataLoader(self.data.file_paths, 0.1, 0,
+                                         verbose=0, rate=self.data.rate,
+                                         channels=self.data.channels,
+                                         unit=self.data.unit,
+                                         amax=self.data.ampl_max,
+                                         end_indices=self.data.end_indices,
+                                         **self.load_kwargs)
+            else:
+                self.loader = DataLoader(self.data.file_paths, 0.1, 0,
+                                         verbose=0, **self.load_kwargs)
+            self.loader.set_unwrap(self.data.unwrap_thresh,
+                                   self.data.unwrap_clips, False,
+                                   self.data.unit)
+            self.channel_loader = ChannelLoader(self.loader)
+        self.channel_loader.active[:] = self.active
+        buffer = np.empty((nframes, self.data.channels),
+                          self.channel_loader.dtype, order='F')
+        self.loader.load_buffer(offset, nframes, buffer)
+        with self.lock:
+            self.offset = offset
+            self.buffer = buffer
+
+    def load_buffer(self, offset, nframes, buffer):
+        """Load data into the buffer using prefetched data.
+
+        Called by the buffer of the raw data instead of its
+        original `load_buffer()` function.  Waits for a running
+        prefetch that overlaps with the requested frames.
+        """
+        if self.is_busy() and offset < sum(self.pending) and \
+           offset + nframes > self.pending[0]:
+            self.wait()
+        with self.lock:
+            p0 = max(offset, self.offset)
+            p1 = min(offset + nframes, self.offset + len(self.buffer))
+            if p1 > p0:
+                for c in np.nonzero(self.active)[0]:
+                    buffer[p0 - offset:p1 - offset, c] = \
+                        self.buffer[p0 - self.offset:p1 - self.offset, c]
+        if p1 <= p0:
+            self.load_file(offset, nframes, buffer)
+            return
+        if p0 > offset:
+            self.load_file(offset, p0 - offset, buffer[:p0 - offset])
+        if p1 < offset + nframes:
+            self.load_file(p1, offset + nframes - p1, buffer[p1 - offset:])
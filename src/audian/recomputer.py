@@ -0,0 +1,214 @@
+"""Recomputer
+
+Recompute derived traces in a background thread.
+
+After a parameter of a derived trace has been changed, the buffers of
+the trace and of all traces derived from it need to be recomputed.
+This is done in chunks in a background thread, such that partial
+results can be displayed while the computation proceeds. A running
+recomputation is cancelled as soon as a new one is requested or the
+buffers need to be moved. The traces of a cancelled recomputation
+are recomputed again together with the new ones. Traces added while
+the buffers stay in place are computed after the running ones.
+
+Traces form a directed acyclic graph via their sources. A trace is
+computed as soon as its source is done. Traces derived from the same
+source are computed at the same time on a pool of threads shared by
+all recomputers (numpy and scipy release the GIL). The time each trace
+took is recorded in `timings`.
+
+A trace whose computation raises an exception is reported and, together
+with all traces derived from it, not computed anymore until it is
+submitted again, e.g. after its parameters have been changed.
+"""
+
+import os
+import threading
+
+from time import perf_counter
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+executor = None
+"""Thread pool shared by all recomputers, see `thread_pool()`."""
+
+
+def thread_pool():
+    """The thread pool shared by all recomputers.
+
+    Created on first use with `Recomputer.threads` threads, or with
+    one thread per CPU if `Recomputer.threads` is not positive.
+
+    Returns
+    -------
+    executor: ThreadPoolExecutor
+        The thread pool.
+    """
+    global executor
+    if executor is None:
+        nthreads = Recomputer.threads
+        if nthreads <= 0:
+            nthreads = os.cpu_count()
+        executor = ThreadPoolExecutor(nthreads)
+    return executor
+
+
+def derived_from(trace, source):
+    """Whether a trace is derived from another one.
+
+    Parameters
+    ----------
+    trace: BufferedData
+        The trace.
+    source: BufferedData
+        The potential source.
+
+    Returns
+    -------
+    derived: bool
+        True if `trace` is `source` or is computed from it.
+    """
+    while trace is not None:
+        if trace is source:
+            return True
+        trace = getattr(trace, 'source', None)
+    return False
+
+
+class Recomputer:
+
+    enabled = True
+    threads = 0
+    verbose = 0
+
+    def __init__(self):
+        self.thread = None
+        self.running = {}
+        self.cancelled = False
+        self.roots = []
+        self.failed = []
+        self.timings = {}
+
+    def __del__(self):
+        self.cancel()
+
+    def submit(self, trace):
+        """Recompute a trace and all traces derived from it.
+
+        A running recomputation is cancelled and restarted together
+        with the requested trace.
+
+        Parameters
+        ----------
+        trace: BufferedData
+            The trace whose parameters have been changed.
+        """
+        self.cancel()
+        # the changed parameters might fix failed computations:
+        self.failed = [t for t in self.failed if not derived_from(t, trace)]
+        self.add(trace)
+        self.start()
+
+    def add(self, trace):
+        """Add a trace to be recomputed by the next `start()`.
+
+        Parameters
+        ----------
+        trace: BufferedData
+            The trace to be recomputed together with all traces
+            derived from it. Ignored if the trace or one of its
+            sources failed to be computed.
+        """
+        if any(derived_from(trace, t) for t in self.failed):
+            return
+        roots = [t for t in self.roots if not derived_from(t, trace)]
+        if not any(derived_from(trace, t) for t in roots):
+            roots.append(trace)
+        self.roots = roots
+
+    def start(self):
+        """Start recomputing the pending traces.
+        """
+        if len(self.roots) == 0 or self.is_busy():
+            return
+        self.cancelled = False
+        self.thread = threading.Thread(target=self.run,
+                                       args=(list(self.roots),),
+                                       daemon=True)
+        self.thread.start()
+
+    def run(self, roots):
+        """Schedule the traces in the background thread.
+
+        Each trace is submitted to the thread pool as soon as its
+        source is computed. Traces added while running are computed
+        afterwards. Traces derived from a trace that failed are
+        skipped.
+        """
+        while len(roots) > 0:
+            ready = list(roots)
+            while len(ready) > 0 or len(self.running) > 0:
+                for trace in ready:
+                    future = thread_pool().submit(self.recompute, trace)
+                    self.running[future] = trace
+                ready = []
+                done, _ = wait(self.running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    trace = self.running.pop(future)
+                    if future.cancelled():
+                        continue
+                    try:
+                        future.result()
+                    except Exception as e:
+                        print(f'! ERROR: recomputing {trace.name} failed: {e}')
+                        self.failed.append(trace)
+                        continue
+                    if not self.cancelled:
+                        ready.extend(trace.dests)
+            if self.cancelled:
+                return
+            roots = [t for t in self.roots if t not in roots]
+            self.roots = roots
+        if self.verbose > 0:
+            for name, t in self.timings.items():
+                print(f'  recomputed {name:<12s} in {1000*t:6.1f}ms')
+
+    def recompute(self, trace):
+        """Recompute a single trace and measure the time it took.
+        """
+        if not trace.need_update or self.cancelled:
+            return
+        t0 = perf_counter()
+        trace.recompute(self)
+        if not self.cancelled:
+            self.timings[trace.name] = perf_counter() - t0
+
+    def cancel(self):
+        """Stop a running recomputation after its current chunk.
+
+        The traces are kept and are recomputed by the next `start()`.
+        """
+        if self.thread is not None:
+            self.cancelled = True
+            # traces waiting for a thread of the pool are not started:
+            for future in list(self.running):
+                future.cancel()
+            self.thread.join()
+            self.thread = None
+
+    def clear(self):
+        """Cancel a running recomputation and forget its traces.
+        """
+        self.cancel()
+        self.roots = []
+        self.failed = []
+
+    def wait(self):
+        """Wait for a running recomputation to finish.
+        """
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def is_busy(self):
+        return self.thread is not None and self.thread.is_alive()
@@ -0,0 +1,327 @@
+"""Region
+
+Lazy access to the traces of a selected region for analyzers.
+
+The data of a trace and its time axis are computed only when an
+analyzer asks for them. The displayed buffers are never moved for a
+region. If the buffer of a trace already holds valid data of the
+selected channel for the whole region, the data are a view into the
+buffer. They are valid until the buffer is moved, copy them if you
+need to keep them. Otherwise, the raw data of the selected channel
+are read from file and processed by detached copies of the traces
+(`BufferedData.detach()`) in chunks. For analyzing several channels
+of a region, the detached copies compute all of them at once and
+`Region.select()` provides the traces of each channel.
+
+- class `RegionData`: Raw data of some channels of a region.
+- class `RegionTrace`: A single trace of a region.
+- class `Region`: All requested traces of a region.
+"""
+
+import numpy as np
+
+from copy import copy
+from math import floor, ceil
+from collections.abc import Mapping
+
+from .bufferedspectrogram import BufferedSpectrogram
+
+
+class RegionData:
+    """Raw data of some channels of a region.
+
+    Source of the detached traces of a region.
+
+    Parameters
+    ----------
+    raw_data: DataLoader
+        The raw data.
+    buffer: 2-D array
+        Frames of the channels.
+    offset: int
+        Index of the first frame in `buffer`.
+    """
+
+    def __init__(self, raw_data, buffer, offset):
+        self.rate = raw_data.rate
+        self.frames = raw_data.frames
+        self.channels = buffer.shape[1]
+        self.buffer = buffer
+        self.offset = offset
+
+
+class RegionTrace:
+    """A single trace of a region.
+
+    Unpacks like a tuple `(time, data)`, or `(time, freqs, data)` for
+    spectrograms.
+
+    Parameters
+    ----------
+    region: Region
+        The region the trace belongs to.
+    trace: BufferedArray
+        The full trace.
+
+    Attributes
+    ----------
+    trace: BufferedArray
+        The full trace.
+    i0: int
+        Index of the first frame of the region.
+    i1: int
+        Index after the last frame of the region.
+    freqs: 1-D array or None
+        Frequencies of a spectrogram, otherwise None.
+    """
+
+    def __init__(self, region, trace):
+        self.region = region
+        self.trace = trace
+        self.i0, self.i1 = region.indices(trace)
+        self.freqs = None
+        if isinstance(trace, BufferedSpectrogram):
+            self.freqs = trace.frequencies
+        self._time = None
+
+
+    @property
+    def time(self):
+        """Times of the frames of the region.
+        """
+        if self._time is None:
+            self._time = np.arange(self.i0, self.i1)/self.trace.rate
+        return self._time
+
+
+    @property
+    def data(self):
+        """Data of the selected channel.
+        """
+        return self.region.data(self.trace, self.i0, self.i1)
+
+
+    def __len__(self):
+        return 2 if self.freqs is None else 3
+
+
+    def __getitem__(self, index):
+        names = ('time', 'data') if self.freqs is None else \
+            ('time', 'freqs', 'data')
+        return getattr(self, names[index])
+
+
+    def __iter__(self):
+        for k in range(len(self)):
+            yield self[k]
+
+
+class Region(Mapping):
+    """All requested traces of a region.
+
+    A mapping of trace names to `RegionTrace`.
+
+    Parameters
+    ----------
+    data: Data
+        The data the region is selected from.
+    t0: float
+        Start time of the region.
+    t1: float
+        End time of the region.
+    channel: int
+        The selected channel.
+    traces: list of BufferedArray
+        The requested traces.
+    channels: None or list of int
+        Channels computed together with `channel` by the detached
+        traces, see `select()`. Only `channel` if None.
+    """
+
+    def __init__(self, data, t0, t1, channel, traces, channels=None):
+        self.raw_data = data.data
+        self.channel_loader = data.channel_loader
+        self.t0 = t0
+        self.t1 = t1
+        self.channel = channel
+        self.channels = [channel] if channels is None else list(channels)
+        if channel not in self.channels:
+            self.channels.append(channel)
+        self.detached = []
+        self.ranges = {}
+        self.traces = {}
+        for t in traces:
+            self.add_range(t, t0, t1)
+            self.traces[t.name] = RegionTrace(self, t)
+
+
+    def add_range(self, trace, t0, t1):
+        """Extend the time range a detached copy of a trace has to cover.
+
+        The ranges of the traces a trace is computed from are extended
+        by the pre- and post-roll the trace needs.
+
+        Parameters
+        ----------
+        trace: BufferedArray
+            The trace.
+        t0: float
+            Start time of the range needed from the trace.
+        t1: float
+            End time of the range needed from the trace.
+        """
+        if trace is not self.raw_data and not trace.causal:
+            # move the edge of the backward pass beyond the range:
+            t1 += trace.source_tbefore
+        if trace in self.ranges:
+            r0, r1 = self.ranges[trace]
+            t0 = min(t0, r0)
+            t1 = max(t1, r1)
+        self.ranges[trace] = (t0, t1)
+        if trace is not self.raw_data:
+            # times of the first and after the last frame of the copy:
+            t0 = floor(t0*trace.rate)/trace.rate
+            t1 = (ceil(t1*trace.rate) + 1)/trace.rate
+            self.add_range(trace.source, t0 - trace.source_tbefore,
+                           t1 + trace.source_tafter)
+
+
+    def select(self, channel):
+        """The same region of another channel.
+
+        The detached traces are shared with this region. Their frames
+        are computed only once for all channels.
+
+        Parameters
+        ----------
+        channel: int
+            The selected channel. One of the `channels` of the region.
+
+        Returns
+        -------
+        region: Region
+            All requested traces of the region for `channel`.
+        """
+        if channel not in self.channels:
+            raise ValueError(f'channel {channel} is not computed by the region')
+        region = copy(self)
+        region.channel = channel
+        region.traces = {}
+        for name, t in self.traces.items():
+            region.traces[name] = RegionTrace(region, t.trace)
+        return region
+
+
+    def indices(self, trace):
+        """Range of frames of the region in a trace.
+
+        Parameters
+        ----------
+        trace: BufferedArray
+            The trace.
+
+        Returns
+        -------
+        i0: int
+            Index of the first frame.
+        i1: int
+            Index after the last frame.
+        """
+        i0 = int(self.t0*trace.rate)
+        if i0 < 0:
+            i0 = 0
+        i1 = int(self.t1*trace.rate) + 1
+        if i1 > len(trace):
+            i1 = len(trace)
+        return i0, i1
+
+
+    def in_buffer(self, trace, i0, i1):
+        """Whether the buffer of a trace holds valid data of the region.
+
+        Parameters
+        ----------
+        trace: BufferedArray
+            The trace.
+        i0: int
+            Index of the first frame.
+        i1: int
+            Index after the last frame.
+        """
+        if i0 < trace.offset or i1 > trace.offset + len(trace.buffer):
+            return False
+        if trace is self.raw_data:
+            return self.channel_loader.loaded[self.channel]
+        v0, v1 = trace.valid[self.channel]
+        return v0 <= i0 and v1 >= i1
+
+
+    def detach(self, trace):
+        """Detached copy of a trace that covers the region.
+
+        Detached copies of the traces it is computed from are made
+        first. Each copy covers the range needed by the requested
+        traces derived from it (`add_range()`).
+
+        Parameters
+        ----------
+        trace: BufferedArray
+            The trace.
+
+        Returns
+        -------
+        detached: BufferedData or RegionData
+            The `channels` of the trace computed independently of the
+            buffers of the traces.
+        """
+        for t, d in self.detached:
+            if t is trace:
+                return d
+        t0, t1 = self.ranges[trace]
+        offset = max(0, floor(t0*trace.rate))
+        end = min(len(trace), ceil(t1*trace.rate) + 1)
+        if trace is self.raw_data:
+            buffer = self.channel_loader.read(offset, end, self.channels)
+            detached = RegionData(trace, buffer, offset)
+        else:
+            source = self.detach(trace.source)
+            detached = trace.detach(source, offset, end - offset)
+        self.detached.append((trace, detached))
+        return detached
+
+
+    def data(self, trace, i0, i1):
+        """Data of the selected channel of a trace.
+
+        Parameters
+        ----------
+        trace: BufferedArray
+            The trace.
+        i0: int
+            Index of the first frame.
+        i1: int
+            Index after the last frame.
+
+        Returns
+        -------
+        data: ndarray
+            The data of the region.
+        """
+        if self.in_buffer(trace, i0, i1):
+            return trace.buffer[i0 - trace.offset:i1 - trace.offset,
+                                self.channel]
+        detached = self.detach(trace)
+        return detached.buffer[i0 - detached.offset:i1 - detached.offset,
+                               self.channels.index(self.channel)]
+
+
+    def __getitem__(self, name):
+        return self.traces[name]
+
+
+    def __iter__(self):
+        return iter(self.traces)
+
+
+    def __len__(self):
+        return len(self.traces)
@@ -4,11 +4,15 @@
 import numpy as np
 import pyqtgraph as pg
 
-from math import floor
+from math import floor, log2
+from PyQt5.QtWidgets import QApplication
 from thunderlab.powerspectrum import decibel
 
 
 class SpecItem(pg.ImageItem):
+
+    auto_pooling = True
+    pooling = 'max'
     
     def __init__(self, data, channel, *args, **kwargs):
         pg.ImageItem.__init__(self, **kwargs)
@@ -16,6 +20,12 @@ class SpecItem(pg.ImageItem):
         
         self.data = data
         self.channel = channel
+        self.first = 0
+        self.step = 1
+        self.generation = -1
+        self.valid = (0, 0)
+        self.spec = None
+        self.overview_shown = False
 
         self.data.plot_items[self.channel] = self
 
@@ -30,11 +40,168 @@ class SpecItem(pg.ImageItem):
             return None
 
         
+    def raw_data(self):
+        """The raw data the spectrogram is derived from.
+        """
+        data = self.data
+        while hasattr(data, 'source'):
+            data = data.source
+        return data
+
+        
+    def overview(self, t0, t1):
+        """Compressed full data for drawing a wide time range.
+
+        Time ranges wider than the `overview_time` of the raw data are
+        drawn from the coarse spectrogram of the compressed raw data.
+        The coarse spectrogram is computed from the raw data that the
+        spectrogram is derived from.
+
+        Parameters
+        ----------
+        t0: float
+            Start of the time range in seconds.
+        t1: float
+            End of the time range in seconds.
+
+        Returns
+        -------
+        compressed: CompressedData or None
+            The compressed raw data, or None if the time range is
+            not that wide or no coarse spectrogram is available.
+        """
+        data = self.raw_data()
+        if t1 - t0 <= data.overview_time:
+            return None
+        compressed = data.compressed
+        if compressed is None or not compressed.complete or \
+           compressed.specs is None:
+            return None
+        return compressed
+
+        
+    def plot_overview(self, compressed):
+        """Show the coarse spectrogram of the full data.
+        """
+        if self.overview_shown:
+            return
+        times, freqs, power = compressed.spec_data(self.channel)
+        spec = decibel(power.T)
+        spec[~np.isfinite(spec)] = np.nan
+        self.setImage(spec, autoLevels=False)
+        rate = compressed.data.rate
+        self.setRect(0, 0, len(times)*compressed.spec_step/rate,
+                     freqs[-1] + rate/compressed.spec_nfft)
+        self.spec = None
+        self.step = 0
+        self.overview_shown = True
+
+        
+    def pooling_step(self):
+        """Number of spectrogram columns pooled into one image column.
+
+        Follows the visible time span and the screen width. Powers of
+        two keep the image stable for small changes of the zoom.
+        """
+        if not self.auto_pooling:
+            return 1
+        vb = self.getViewBox()
+        if not isinstance(vb, pg.ViewBox):
+            return 1
+        t0, t1 = vb.viewRange()[0]
+        max_pixel = QApplication.desktop().screenGeometry().width()
+        ncols = (t1 - t0)*self.data.rate/max_pixel
+        if ncols < 2:
+            return 1
+        return 2**int(floor(log2(ncols)))
+
+
+    def pool(self, buffer, start, stop, step):
+        """Pool and convert spectrogram columns to decibel.
+
+        Parameters
+        ----------
+        buffer: 2D ndarray
+            Power of a single channel (columns x frequencies).
+        start: int
+            Index of first column in `buffer`.
+        stop: int
+            Index after the last column in `buffer`.
+        step: int
+            Number of columns to be pooled.
+
+        Returns
+        -------
+        spec: 2D ndarray
+            Decibel of the pooled power (frequencies x columns).
+        """
+        if step == 1:
+            return decibel(buffer[start:stop].T)
+        segments = np.arange(0, stop - start, step)
+        if self.pooling == 'mean':
+            power = np.add.reduceat(buffer[start:stop], segments, axis=0)/step
+        else:
+            power = np.maximum.reduceat(buffer[start:stop], segments, axis=0)
+        return decibel(power.T)
+
+        
     def update_plot(self):
-        if not self.data.buffer_changed[self.channel]:
+        vb = self.getViewBox()
+        if isinstance(vb, pg.ViewBox):
+            compressed = self.overview(*vb.viewRange()[0])
+            if compressed is not None:
+                self.plot_overview(compressed)
+                return
+        self.overview_shown = False
+        step = self.pooling_step()
+        if not self.data.buffer_changed[self.channel] and step == self.step:
             return
-        self.setImage(decibel(self.data.buffer[:, self.channel, :].T),
-                      autoLevels=False)
-        self.setRect(*self.data.spec_rect)
+        # cleared before the buffer is read, such that frames computed
+        # meanwhile are shown by the next update:
         self.data.buffer_changed[self.channel] = False
-
+        offset = self.data.offset
+        # valid frames, taken before the buffer they refer to:
+        generation = self.data.generation
+        v0, v1 = self.data.valid[self.channel]
+        buffer = self.data.buffer[:, self.channel, :]
+        n = len(buffer)
+        if step > n:
+            step = max(1, 2**int(floor(log2(max(1, n)))))
+        # complete pooled columns in buffer:
+        first = (offset + step - 1)//step
+        last = (offset + n)//step
+        # columns computed from valid frames only:
+        c0 = min(max(first, (v0 + step - 1)//step), last)
+        c1 = max(min(last, v1//step), c0)
+        o0 = o1 = c0
+        if self.spec is not None and step == self.step and \
+           self.generation == generation and \
+           self.spec.shape[0] == buffer.shape[1]:
+            # valid columns converted before:
+            o0 = max(c0, self.valid[0])
+            o1 = min(c1, self.valid[1])
+        spec = np.full((buffer.shape[1], last - first), np.nan)
+        if o1 > o0:
+            # reuse decibels of the overlap and convert only new columns:
+            spec[:, o0 - first:o1 - first] = \
+                self.spec[:, o0 - self.first:o1 - self.first]
+            if o0 > c0:
+                spec[:, c0 - first:o0 - first] = \
+                    self.pool(buffer, c0*step - offset, o0*step - offset, step)
+            if c1 > o1:
+                spec[:, o1 - first:c1 - first] = \
+                    self.pool(buffer, o1*step - offset, c1*step - offset, step)
+        elif c1 > c0:
+            spec[:, c0 - first:c1 - first] = \
+                self.pool(buffer, c0*step - offset, c1*step - offset, step)
+        self.spec = spec
+        self.first = first
+        self.valid = (c0, c1)
+        self.step = step
+        self.generation = generation
+        self.setImage(self.spec, autoLevels=False)
+        rect = list(self.data.spec_rect)
+        if len(rect) == 4:
+            rect[0] = first*step/self.data.rate
+            rect[2] = (last - first)*step/self.data.rate
+            self.setRect(*rect)
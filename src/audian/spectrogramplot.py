@@ -93,6 +93,7 @@ class SpectrogramPlot(TimePlot):
 
         # power spectrum:
         self.spec_data = None
+        self.spec_item = None
         self.powerax = PowerPlot(self.z() + self.y(), channel, browser)
         self.powerax.setVisible(show_powers)
 
@@ -131,6 +132,7 @@ class SpectrogramPlot(TimePlot):
         super().add_item(item, is_data)
         if is_data and isinstance(item, SpecItem):
             self.spec_data = item.data
+            self.spec_item = item
             self.cbar.setImageItem(item)
             # TODO: this should go into the realm of PlotRanges:
             if self.highpass_handle is not None:
@@ -146,19 +148,35 @@ class SpectrogramPlot(TimePlot):
         if self.spec_data is None:
             return
         t0, t1 = self.getViewBox().viewRange()[0]
-        i0 = int(t0*self.spec_data.rate)
-        if i0 < 0:
-            i0 = 0
-        i1 = max(int(t1*self.spec_data.rate) - 1, i0 + 1)
-        # the -1                             ^^^ is important to not move the spectrogram buffer at end of data.
-        if i1 > len(self.spec_data):
-            i1 = len(self.spec_data)
-            if i1 == i0:
-                i0 = max(0, i1 -1)
-        power = np.mean(self.spec_data[i0:i1, self.channel, :], axis=0)
+        compressed = self.spec_item.overview(t0, t1)
+        if compressed is not None:
+            # wide views from the coarse spectrogram of the full data:
+            times, freqs, power = compressed.spec_data(self.channel)
+            dt = compressed.spec_step/compressed.data.rate
+            j0 = max(0, int(t0/dt))
+            j1 = min(max(int(t1/dt), j0 + 1), len(power))
+            power = np.mean(power[j0:j1], axis=0)
+        else:
+            i0 = int(t0*self.spec_data.rate)
+            if i0 < 0:
+                i0 = 0
+            i1 = max(int(t1*self.spec_data.rate) - 1, i0 + 1)
+            # the -1                             ^^^ is important to not move the spectrogram buffer at end of data.
+            if i1 > len(self.spec_data):
+                i1 = len(self.spec_data)
+                if i1 == i0:
+                    i0 = max(0, i1 -1)
+            if t1 - t0 > self.spec_item.raw_data().overview_time:
+                # do not grow the buffer for wide views:
+                offset = self.spec_data.offset
+                n = len(self.spec_data.buffer)
+                if n > 0 and i0 < offset + n and i1 > offset:
+                    i0 = max(i0, offset)
+                    i1 = min(i1, offset + n)
+            power = np.mean(self.spec_data[i0:i1, self.channel, :], axis=0)
+            freqs = np.arange(power.shape[-1])*self.spec_data.fresolution
         power = decibel(power)
         power[power < -200] = -200
-        freqs = np.arange(len(power))*self.spec_data.fresolution
         zeros = np.zeros(len(freqs)) - 200
         self.powerax.power_item.setData(power, freqs)
         self.powerax.zero_item.setData(zeros, freqs)
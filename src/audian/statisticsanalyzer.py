@@ -7,6 +7,7 @@ class StatisticsAnalyzer(Analyzer):
     
     def __init__(self, browser, source_name='filtered'):
         super().__init__(browser, 'statistics', source_name)
+        self.trace_names = [self.source_name]
         nd = int(-np.floor(np.log10(self.source.ampl_max/4e4)))
         if nd < 0:
             nd = 0
@@ -16,6 +17,6 @@ class StatisticsAnalyzer(Analyzer):
 
         
     def analyze(self, t0, t1, channel, traces):
-        source = traces[self.source_name][1]
+        source = traces[self.source_name].data
         self.store(np.mean(source), np.std(source))
 
@@ -112,10 +112,7 @@ class TimePlot(RangePlot):
         amin = None
         amax = None
         for item in self.data_items:
-            i0 = int(np.round(t0*item.rate))
-            i1 = int(np.round(t1*item.rate))
-            a0 = np.min(item.data[i0:i1, item.channel])
-            a1 = np.max(item.data[i0:i1, item.channel])
+            a0, a1 = item.amplitudes(t0, t1)
             if amin is None or a0 < amin:
                 amin = a0
             if amax is None or a1 > amax:
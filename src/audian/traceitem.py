@@ -6,6 +6,8 @@ import pyqtgraph as pg
 
 from PyQt5.QtWidgets import QApplication
 
+from .minmaxpyramid import MinMaxPyramid
+
 
 class TraceItem(pg.PlotDataItem):
     
@@ -14,6 +16,7 @@ class TraceItem(pg.PlotDataItem):
         self.rate = self.data.rate
         self.channel = channel
         self.step = 1
+        self.pyramid = MinMaxPyramid(self.data, self.channel)
         self.color = self.data.color
         self.lw_thin = self.data.lw_thin
         self.lw_thick = self.data.lw_thick
@@ -34,6 +37,8 @@ class TraceItem(pg.PlotDataItem):
         vb = self.getViewBox()
         if not isinstance(vb, pg.ViewBox):
             return
+        # the rate of a derived trace might have changed:
+        self.rate = self.data.rate
         # index range and steps that needs to be drawn:
         t0, t1 = vb.viewRange()[0]
         start = max(0, int(t0*self.rate))
@@ -42,26 +47,22 @@ class TraceItem(pg.PlotDataItem):
         max_pixel = QApplication.desktop().screenGeometry().width()
         self.step = max(1, (tstop - start)//max_pixel)
         if self.step > 1:
-            # downsample aligned to multiples of step:
-            start = (start//self.step)*self.step
-            tstop = (stop//self.step + 1)*self.step
-            stop = min(len(self.data), tstop)
-            # stay within loaded buffer:
-            while start < self.data.offset:
-                start += self.step
-            while stop > self.data.offset + len(self.data.buffer):
-                stop -= self.step
-            # init plot buffer:
-            segments = np.arange(0, stop - start, self.step)
-            plot_data = np.zeros(2*len(segments))
-            # downsample using min and max during step frames:
-            np.minimum.reduceat(self.data[start:stop, self.channel],
-                                segments, out=plot_data[0::2])
-            np.maximum.reduceat(self.data[start:stop, self.channel],
-                                segments, out=plot_data[1::2])
+            compressed = self.data.compressed
+            if compressed is not None and compressed.complete and \
+               compressed.level(self.step) >= 0:
+                # downsample from compressed full data:
+                start, self.step, plot_data = \
+                    compressed.downsample(start, stop, self.step,
+                                          self.channel)
+            else:
+                if self.data.buffer_changed[self.channel]:
+                    self.pyramid.clear()
+                    self.data.buffer_changed[self.channel] = False
+                # downsample using min and max during step frames:
+                start, self.step, plot_data = \
+                    self.pyramid.downsample(start, stop, self.step)
             step2 = self.step/2
-            plot_time = np.arange(start, start + len(plot_data)*step2,
-                                  step2)/self.rate
+            plot_time = (start + np.arange(len(plot_data))*step2)/self.rate
             self.setPen(dict(color=self.color, width=self.lw_thin))
             self.setSymbol(None)
             self.setData(plot_time, plot_data)
@@ -79,9 +80,48 @@ class TraceItem(pg.PlotDataItem):
                 self.setSymbol('o')
             else:
                 self.setSymbol(None)
-        self.data.buffer_changed[self.channel] = False
 
 
+    def amplitudes(self, t0, t1):
+        """Minimum and maximum of the trace within a time range.
+
+        Parts of the time range that are not buffered are taken from
+        the compressed full data, if available. Otherwise the time
+        range is restricted to the buffer.
+
+        Parameters
+        ----------
+        t0: float
+            Start of the time range in seconds.
+        t1: float
+            End of the time range in seconds.
+
+        Returns
+        -------
+        amin: float
+            Minimum of the trace.
+        amax: float
+            Maximum of the trace.
+        """
+        i0 = max(0, int(np.round(t0*self.rate)))
+        i1 = min(len(self.data), int(np.round(t1*self.rate)))
+        offset = self.data.offset
+        n = len(self.data.buffer)
+        if i0 < offset or i1 > offset + n:
+            compressed = self.data.compressed
+            if compressed is not None and compressed.complete:
+                step = max(compressed.steps[0], (i1 - i0)//1000)
+                start, step, data = compressed.downsample(i0, i1, step,
+                                                          self.channel)
+                if len(data) > 0:
+                    return np.min(data), np.max(data)
+            if i0 < offset + n and i1 > offset:
+                i0 = max(i0, offset)
+                i1 = min(i1, offset + n)
+        return np.min(self.data[i0:i1, self.channel]), \
+            np.max(self.data[i0:i1, self.channel])
+
+        
     def get_amplitude(self, x, y, x1=None):
         """Get trace amplitude next to cursor position. """
         idx = int(np.round(x*self.rate))